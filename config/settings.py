@@ -1,6 +1,7 @@
 import os
 from pathlib import Path
 from datetime import timedelta
+from celery.schedules import crontab
 from dotenv import load_dotenv
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -26,6 +27,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'corsheaders',
     'students',
@@ -81,6 +83,18 @@ DATABASES = {
     }
 }
 
+# Cache
+# Shared by every gunicorn/celery worker so that write-driven
+# invalidation (see students/cache.py) is seen by all of them.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.getenv('CACHE_REDIS_URL', 'redis://redis:6379/1'),
+        'KEY_PREFIX': 'lesa',
+    }
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
 
@@ -222,3 +236,10 @@ CELERY_BROKER_URL = os.getenv('CELERY_BROKER_URL', 'redis://redis:6379/0')
 CELERY_RESULT_BACKEND = os.getenv(
     'CELERY_RESULT_BACKEND', 'redis://redis:6379/0'
 )
+CELERY_BEAT_SCHEDULE = {
+    # Pending fee payments for the new month, see students/fees.py
+    'generate-monthly-fees': {
+        'task': 'students.tasks.generate_monthly_fees',
+        'schedule': crontab(minute=30, hour=0, day_of_month=1),
+    },
+}
@@ -10,12 +10,14 @@ from rest_framework_simplejwt.views import (
 )
 from students.views import (
     SecureLoginAPIView,
-    ListCreateStudentAPIView,
+    ListCreateStudentAPIView, StudentExportAPIView,
+    StudentImportAPIView, StudentImportJobAPIView,
     BulkEnrollStudentAPIView,
-    ListGuardianAPIView,
+    ListGuardianAPIView, GuardianBulkUpsertAPIView,
     GuardianDetailAPIView,
-    StudentDetailAPIView,
-    ListCreatePaymentAPIView,
+    StudentDetailAPIView, StudentAttendanceHistoryAPIView,
+    StudentPaymentHistoryAPIView,
+    ListCreatePaymentAPIView, FeeReconciliationAPIView,
     DashboardStatsAPIView,
     SendMessageAPIView,
     ListCreateExpenseAPIView,
@@ -65,11 +67,29 @@ urlpatterns = [
     # Endpoints
     path("api/secure-login/", SecureLoginAPIView.as_view()),
     path('api/guardian/', ListGuardianAPIView.as_view()),
+    path('api/guardian/bulk/', GuardianBulkUpsertAPIView.as_view()),
     path('api/guardian/<int:pk>/', GuardianDetailAPIView.as_view()),
     path("api/students/", ListCreateStudentAPIView.as_view()),
+    path("api/students/export/", StudentExportAPIView.as_view()),
+    path("api/students/import/", StudentImportAPIView.as_view()),
+    path(
+        "api/students/import/<int:job_id>/",
+        StudentImportJobAPIView.as_view()
+    ),
     path('api/students/<int:student_id>/', StudentDetailAPIView.as_view()),
+    path(
+        'api/students/<int:student_id>/attendance/',
+        StudentAttendanceHistoryAPIView.as_view()
+    ),
+    path(
+        'api/students/<int:student_id>/payments/',
+        StudentPaymentHistoryAPIView.as_view()
+    ),
     path('api/bulk-enroll-students', BulkEnrollStudentAPIView.as_view()),
     path('api/payments/', ListCreatePaymentAPIView.as_view()),
+    path(
+        'api/payments/reconcile/', FeeReconciliationAPIView.as_view()
+    ),
     path("api/dashboard-stats", DashboardStatsAPIView.as_view()),
     path("api/send-message/", SendMessageAPIView.as_view()),
     path("api/expenses/", ListCreateExpenseAPIView.as_view()),
@@ -335,7 +335,7 @@ const AttendanceDashboard = () => {
                                         <div className="flex items-center gap-5 relative z-10">
                                             <div className="w-16 h-16 rounded-[1.5rem] overflow-hidden shrink-0 bg-slate-200 dark:bg-slate-800 flex items-center justify-center text-2xl font-black text-slate-400 border-2 border-white/10 shadow-lg">
                                                 {student.student_image ? (
-                                                    <img src={`${BASE_URL}${student.student_image}`} className="w-full h-full object-cover transition-transform group-hover/card:scale-110" alt="Student" />
+                                                    <img src={`${BASE_URL}${student.student_image_256 || student.student_image}`} className="w-full h-full object-cover transition-transform group-hover/card:scale-110" alt="Student" />
                                                 ) : (
                                                     <span className="italic uppercase tracking-tighter">{student.student_name.charAt(0)}</span>
                                                 )}
@@ -633,7 +633,7 @@ const Dashboard = () => {
                                     : 'bg-gradient-to-br from-slate-500 to-slate-600'
                                   } shadow-lg shadow-black/20`}>
                                   {s.student_image ? (
-                                    <img src={s.student_image.startsWith('http') ? s.student_image : `http://127.0.0.1:8000${s.student_image}`} alt={s.name} className="w-full h-full object-cover" />
+                                    <img src={(s.student_image_64 || s.student_image).startsWith('http') ? (s.student_image_64 || s.student_image) : `http://127.0.0.1:8000${s.student_image_64 || s.student_image}`} alt={s.name} className="w-full h-full object-cover" />
                                   ) : (
                                     s.name.charAt(0)
                                   )}
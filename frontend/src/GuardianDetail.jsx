@@ -33,7 +33,7 @@ const GuardianDetail = () => {
     const fetchGuardian = async () => {
         try {
             const token = localStorage.getItem('access_token');
-            const response = await axios.get(`http://127.0.0.1:8000/api/guardian/${id}/`, {
+            const response = await axios.get(`http://127.0.0.1:8000/api/guardian/${id}/?expand=students`, {
                 headers: { 'Authorization': `Bearer ${token}` }
             });
             setGuardian(response.data);
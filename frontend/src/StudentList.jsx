@@ -543,7 +543,7 @@ const StudentList = () => {
                                     : 'bg-gradient-to-br from-slate-500 to-slate-600'
                                   } shadow-lg shadow-black/20`}>
                                   {s.student_image ? (
-                                    <img src={`http://127.0.0.1:8000${s.student_image}`} alt={s.name} className="w-full h-full object-cover" />
+                                    <img src={`http://127.0.0.1:8000${s.student_image_64 || s.student_image}`} alt={s.name} className="w-full h-full object-cover" />
                                   ) : (
                                     s.name.charAt(0)
                                   )}
@@ -0,0 +1,21 @@
+# Generated by Django 6.0.2 on 2026-10-17 14:10
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction; the
+    # tables stay writable while the indexes are built
+    atomic = False
+
+    dependencies = [
+        ('notification_system', '0002_notificationpreference_default_notification_type'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='notification',
+            index=models.Index(fields=['is_read', '-created_at'], name='notification_read_created_idx'),
+        ),
+    ]
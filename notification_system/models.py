@@ -1,7 +1,7 @@
 import calendar
 
 from django.db import models
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 
 from django.utils import timezone
@@ -9,8 +9,9 @@ from datetime import timedelta
 
 from students.models import (
     Student, Teacher, StudentAttendance,
-    AttendanceStatus, FeePayment
+    AttendanceStatus, FeePayment, fee_payments_bulk_saved
 )
+from students.cache import bump_cache_version
 
 
 class NotificationPriority(models.TextChoices):
@@ -93,6 +94,15 @@ class Notification(BaseClass):
     deleted_at = models.DateTimeField(null=True, blank=True)
     is_active = models.BooleanField(default=True)
 
+    class Meta:
+        indexes = [
+            # The notification list, filtered by is_read, newest first
+            models.Index(
+                fields=['is_read', '-created_at'],
+                name='notification_read_created_idx',
+            ),
+        ]
+
 
 @receiver(post_save, sender=StudentAttendance)
 def attendance_shortage_notification(sender, instance, **kwargs):
@@ -163,9 +173,19 @@ def attendance_shortage_notification(sender, instance, **kwargs):
             )
 
 
-@receiver(post_save, sender=FeePayment)
-def send_fee_payment_notification(sender, instance, **kwargs):
-    student = instance.student
+def create_fee_payment_notifications(payments):
+    """
+    Create the "Fee Payment Alert" of each student with a pending
+    payment in `payments` and no active alert yet, during the last ten
+    days of the month. Takes a fixed number of queries for any number
+    of payments.
+    """
+    pending = [
+        payment for payment in payments
+        if payment.status == 'pending' and payment.student_id
+    ]
+    if not pending:
+        return
 
     notifications_enabled = NotificationPreference.objects.filter(
         default_notification_type=NotificationType.STUDENT,
@@ -173,34 +193,57 @@ def send_fee_payment_notification(sender, instance, **kwargs):
     ).exists()
     if not notifications_enabled:
         return
-    is_pending = instance.status == 'pending'
 
     today = timezone.now().date()
     _, last_day_num = calendar.monthrange(today.year, today.month)
     last_day_of_month = today.replace(day=last_day_num)
     ten_days_before_end = last_day_of_month - timedelta(days=10)
-    is_within_date_window = ten_days_before_end <= today <= last_day_of_month
+    if not ten_days_before_end <= today <= last_day_of_month:
+        return
 
-    already_notified = Notification.objects.filter(
+    already_notified = set(Notification.objects.filter(
         title="Fee Payment Alert",
-        student=student,
+        student_id__in={payment.student_id for payment in pending},
         notification_type=NotificationType.STUDENT,
         is_active=True,
-    ).exists()
-
-    if (
-        not already_notified and
-        is_within_date_window and
-        is_pending
-    ):
-        Notification.objects.create(
-            student=student,
+    ).values_list('student_id', flat=True))
+
+    notifications = {}
+    for payment in pending:
+        if payment.student_id in already_notified:
+            continue
+        if payment.student_id in notifications:
+            continue
+        notifications[payment.student_id] = Notification(
+            student=payment.student,
             title="Fee Payment Alert",
             message=(
-                f"Student name {student.name} has "
-                f"Pending Fee Payment with amount of {instance.amount}"
+                f"Student name {payment.student.name} has "
+                f"Pending Fee Payment with amount of {payment.amount}"
             ),
             priority=NotificationPriority.HIGH,
             notification_type=NotificationType.STUDENT,
             is_active=True,
         )
+    if notifications:
+        Notification.objects.bulk_create(notifications.values())
+        # bulk_create skips the post_save that bumps it
+        bump_cache_version(Notification)
+
+
+@receiver(post_save, sender=FeePayment)
+def send_fee_payment_notification(sender, instance, **kwargs):
+    create_fee_payment_notifications([instance])
+
+
+@receiver(fee_payments_bulk_saved, sender=FeePayment)
+def send_bulk_fee_payment_notifications(sender, payments, **kwargs):
+    create_fee_payment_notifications(payments)
+
+
+@receiver(post_save, sender=Notification)
+@receiver(post_delete, sender=Notification)
+@receiver(post_save, sender=NotificationPreference)
+@receiver(post_delete, sender=NotificationPreference)
+def invalidate_cached_notification_data(sender, **kwargs):
+    bump_cache_version(sender)
@@ -1,6 +1,7 @@
 from rest_framework import serializers
 from .models import NotificationPreference, Notification
 from students.models import Student, Teacher
+from students.serializers import SparseFieldsetsMixin
 
 
 class NotificationPreferenceSerializer(serializers.ModelSerializer):
@@ -41,13 +42,19 @@ class TeacherNotificationSerializer(serializers.ModelSerializer):
         ]
 
 
-class ReadNotificationSerializer(serializers.ModelSerializer):
+class ReadNotificationSerializer(
+    SparseFieldsetsMixin, serializers.ModelSerializer
+):
     student = StudentNotificationSerializer(read_only=True)
     teacher = TeacherNotificationSerializer(read_only=True)
 
     class Meta:
         model = Notification
         fields = '__all__'
+        select_related_fields = {
+            'student': ['student'],
+            'teacher': ['teacher'],
+        }
 
 
 class UpdateNotificationSerializer(serializers.ModelSerializer):
@@ -1,3 +1,55 @@
+import datetime
+from unittest import mock
+
 from django.test import TestCase
+from django.utils import timezone
+
+from students.enrollment import enroll_students
+from students.models import Guardian
+from .models import Notification, NotificationPreference
+
+
+# Inside the last ten days of the month, when fee alerts are sent
+ALERT_WINDOW = timezone.make_aware(datetime.datetime(2026, 10, 25, 9))
+
+
+@mock.patch('notification_system.models.timezone.now', lambda: ALERT_WINDOW)
+class BulkFeePaymentNotificationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        NotificationPreference.objects.create()
+        cls.guardian = Guardian.objects.create(
+            cnic='35202-2222222-2', phone_number='0300-2222222'
+        )
+
+    def test_enrollment_alerts_pending_initial_fees(self):
+        created, errors = enroll_students(self.guardian, [
+            {
+                'name': 'Ali', 'grade': '3', 'age': 9,
+                'initial_fee': {'amount': 5000, 'status': 'pending'},
+            },
+            {
+                'name': 'Sara', 'grade': '2', 'age': 7,
+                'initial_fee': {'amount': 4000, 'status': 'paid'},
+            },
+        ])
+        self.assertEqual(errors, [])
+        alerts = Notification.objects.filter(title='Fee Payment Alert')
+        self.assertEqual(
+            list(alerts.values_list('student__name', flat=True)), ['Ali']
+        )
 
-# Create your tests here.
+    def test_student_with_an_alert_gets_no_second_one(self):
+        created, _ = enroll_students(self.guardian, [
+            {
+                'name': 'Ali', 'grade': '3', 'age': 9,
+                'initial_fee': {'amount': 5000, 'status': 'pending'},
+            },
+        ])
+        payment = created[0].payments.get()
+        payment.amount = 5500
+        payment.save()
+        self.assertEqual(
+            Notification.objects.filter(title='Fee Payment Alert').count(), 1
+        )
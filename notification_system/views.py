@@ -1,13 +1,18 @@
 import traceback
 
 from django.utils import timezone
+from django.utils.decorators import method_decorator
 
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.pagination import PageNumberPagination
 
-from drf_spectacular.utils import extend_schema
+from drf_spectacular.utils import extend_schema, OpenApiParameter
+from drf_spectacular.types import OpenApiTypes
+from students.conditional import conditional_get
+from students.models import Student, Teacher
+from students.serializers import get_sparse_fieldsets
 from .models import NotificationPreference, Notification
 from .serializers import (
     NotificationPreferenceSerializer, CreateNotificationSerializer,
@@ -34,6 +39,7 @@ class NotificationPreferenceAPIView(APIView):
         responses={200: NotificationPreferenceSerializer(many=True)},
         tags=['Notification System']
     )
+    @method_decorator(conditional_get(NotificationPreference))
     def get(self, request):
         try:
             preference = NotificationPreference.objects.all().values(
@@ -106,6 +112,7 @@ class NotificationPreferenceDetailAPIView(APIView):
         },
         tags=['Notification System']
     )
+    @method_decorator(conditional_get(NotificationPreference))
     def get(self, request, pk):
         try:
             preference = NotificationPreference.objects.get(pk=pk)
@@ -200,23 +207,44 @@ class NotificationPreferenceDetailAPIView(APIView):
 class ListCreateNotificationAPIView(APIView):
     @extend_schema(
         summary="List All Notifications",
-        description="List all notification records.",
+        description="List all notification records, newest first.",
+        parameters=[
+            OpenApiParameter(
+                'fields', OpenApiTypes.STR, OpenApiParameter.QUERY,
+                description='Comma separated fields to return'
+            ),
+            OpenApiParameter(
+                'is_read', OpenApiTypes.BOOL, OpenApiParameter.QUERY,
+                description='Only read (true) or unread (false) notifications'
+            ),
+        ],
         responses={
             200: ReadNotificationSerializer,
             500: {"description": "Internal server error"}
         },
         tags=['Notification System']
     )
+    @method_decorator(conditional_get(Notification, Student, Teacher))
     def get(self, request):
         try:
-            notification = Notification.objects.all()
+            sparse = get_sparse_fieldsets(request)
+            notifications = Notification.objects.all()
+            is_read = request.query_params.get('is_read')
+            if is_read is not None:
+                notifications = notifications.filter(
+                    is_read=is_read.lower() == 'true'
+                )
+            notification = ReadNotificationSerializer.optimize_queryset(
+                notifications.order_by('-created_at', '-id'), **sparse
+            )
             paginator = NotificationPagination()
             paginated_data = paginator.paginate_queryset(
                 notification, request
             )
             serializer = ReadNotificationSerializer(
                 paginated_data,
-                many=True
+                many=True,
+                **sparse
             )
             response = paginator.get_paginated_response(serializer.data)
             return response
@@ -270,9 +298,13 @@ class NotificationDetailAPIView(APIView):
     )
     def get(self, request, pk):
         try:
-            notification = Notification.objects.get(pk=pk)
+            sparse = get_sparse_fieldsets(request)
+            notification = ReadNotificationSerializer.optimize_queryset(
+                Notification.objects.all(), **sparse
+            ).get(pk=pk)
             serializer = ReadNotificationSerializer(
-                notification
+                notification,
+                **sparse
             )
             notification.is_read = True
             notification.read_at = timezone.now()
@@ -1,9 +1,10 @@
 from django.contrib import admin
 from .models import (
     CustomUser, Guardian, Student,
-    FeePayment, Teacher, SalaryPayment,
+    FeePayment, FeeSchedule, MonthlyLedger, Teacher, SalaryPayment,
     Expense, StudentTestRecords, Subject,
-    TeacherSubject, StudentAttendance, TeacherAttendance
+    TeacherSubject, StudentAttendance, TeacherAttendance,
+    StudentImportJob
 )
 
 
@@ -32,13 +33,35 @@ class StudentAdmin(admin.ModelAdmin):
         'id', 'name', 'age', 'grade', 'student_image',
         'guardian', 'date_joined',
         'is_active', 'total_tests_conducted',
-        'overall_attendance', 'created_at'
+        'overall_attendance', 'latest_fee_status', 'created_at'
     )
-    list_filter = ('grade', 'is_active', 'date_joined')
+    list_filter = ('grade', 'is_active', 'latest_fee_status', 'date_joined')
     search_fields = ('name', 'guardian__name')
     autocomplete_fields = ['guardian']
 
 
+@admin.register(FeeSchedule)
+class FeeScheduleAdmin(admin.ModelAdmin):
+    list_display = ('grade', 'amount', 'is_active', 'updated_at')
+    list_filter = ('is_active',)
+    readonly_fields = ('created_at', 'updated_at')
+
+
+@admin.register(MonthlyLedger)
+class MonthlyLedgerAdmin(admin.ModelAdmin):
+    list_display = (
+        'month', 'source', 'category', 'status', 'total', 'entries',
+        'updated_at'
+    )
+    list_filter = ('source', 'status', 'month')
+    # Kept up to date by the FeePayment/Expense signals and the
+    # reconcile_ledger command, never edited by hand
+    readonly_fields = (
+        'month', 'source', 'category', 'status', 'total', 'entries',
+        'updated_at'
+    )
+
+
 @admin.register(FeePayment)
 class FeePaymentAdmin(admin.ModelAdmin):
     list_display = (
@@ -164,3 +187,13 @@ class TeacherAttendanceAdmin(admin.ModelAdmin):
     list_filter = ('status', 'date')
     search_fields = ('teacher__name', 'remarks')
     readonly_fields = ('created_at', 'updated_at')
+
+
+@admin.register(StudentImportJob)
+class StudentImportJobAdmin(admin.ModelAdmin):
+    list_display = (
+        'id', 'file', 'status', 'rows_done', 'rows_failed',
+        'created_by', 'created_at', 'finished_at'
+    )
+    list_filter = ('status',)
+    readonly_fields = ('errors', 'started_at', 'finished_at')
@@ -0,0 +1,131 @@
+import time
+
+from django.core.cache import cache
+
+
+CACHE_VERSION_KEY = 'cache_version_{label}'
+CACHE_MODIFIED_KEY = 'cache_modified_{label}'
+
+
+def _version_key(model):
+    return CACHE_VERSION_KEY.format(label=model._meta.label_lower)
+
+
+def _modified_key(model):
+    return CACHE_MODIFIED_KEY.format(label=model._meta.label_lower)
+
+
+def get_cache_versions(*models):
+    """
+    Return the current version counter of each model, in order.
+    Models that were never written since the cache was flushed
+    report version 0.
+    """
+    keys = [_version_key(model) for model in models]
+    versions = cache.get_many(keys)
+    return [versions.get(key, 0) for key in keys]
+
+
+def bump_cache_version(model):
+    """
+    Invalidate every cached entry built from `model` by moving its
+    version counter forward. Counters never expire so that all workers
+    sharing the cache agree on the current version.
+    """
+    cache.set(_modified_key(model), time.time(), timeout=None)
+    key = _version_key(model)
+    if cache.add(key, 1, timeout=None):
+        return
+    try:
+        cache.incr(key)
+    except ValueError:
+        # The counter was evicted between add() and incr()
+        cache.set(key, 1, timeout=None)
+
+
+def get_last_modified(*models):
+    """
+    Return the Unix time of the latest write to any of `models`.
+    Models with no recorded write (the cache was flushed, or the model
+    was never written) are recorded as modified now, so clients holding
+    an older copy revalidate it instead of trusting it.
+    """
+    keys = [_modified_key(model) for model in models]
+    stamps = cache.get_many(keys)
+    now = time.time()
+    for key in keys:
+        if key not in stamps:
+            cache.add(key, now, timeout=None)
+            stamps[key] = cache.get(key, now)
+    return max(stamps.values())
+
+
+REBUILD_LOCK_KEY = '{key}_rebuild_lock'
+REBUILD_LOCK_TIMEOUT = 30
+REBUILD_WAIT = 5
+REBUILD_POLL_INTERVAL = 0.05
+
+
+def _get_entry(key, models):
+    """
+    The cached entry for `key` if it was built from the current
+    versions of `models`, else None. Entry and version counters are
+    read in a single round trip.
+    """
+    version_keys = [_version_key(model) for model in models]
+    found = cache.get_many([key, *version_keys])
+    entry = found.get(key)
+    versions = [found.get(version_key, 0) for version_key in version_keys]
+    if entry is not None and entry['versions'] == versions:
+        return entry
+    return None
+
+
+def _rebuild(key, models, build, timeout, stale_timeout):
+    versions = get_cache_versions(*models)
+    try:
+        value = build()
+        cache.set(key, {
+            'versions': versions,
+            'expires': time.time() + timeout,
+            'value': value,
+        }, timeout=timeout + stale_timeout)
+        return value
+    finally:
+        cache.delete(REBUILD_LOCK_KEY.format(key=key))
+
+
+def get_or_build(key, models, build, timeout, stale_timeout=None):
+    """
+    Return the cached value for `key`, calling `build()` to refresh it
+    with at most one worker rebuilding a given key at a time.
+
+    The entry records the version counters of `models` it was built
+    from. Once `timeout` has passed with no write to those models, the
+    old value is still served for up to `stale_timeout` seconds while
+    the worker holding the rebuild lock refreshes it. A missing entry,
+    or one outdated by a write, is never served: other workers wait
+    for the rebuild instead, and only build it themselves if the wait
+    runs out.
+    """
+    if stale_timeout is None:
+        stale_timeout = timeout
+    lock_key = REBUILD_LOCK_KEY.format(key=key)
+
+    entry = _get_entry(key, models)
+    if entry is not None:
+        if entry['expires'] > time.time():
+            return entry['value']
+        if not cache.add(lock_key, 1, timeout=REBUILD_LOCK_TIMEOUT):
+            return entry['value']
+        return _rebuild(key, models, build, timeout, stale_timeout)
+
+    deadline = time.time() + REBUILD_WAIT
+    while not cache.add(lock_key, 1, timeout=REBUILD_LOCK_TIMEOUT):
+        if time.time() >= deadline:
+            return build()
+        time.sleep(REBUILD_POLL_INTERVAL)
+        entry = _get_entry(key, models)
+        if entry is not None:
+            return entry['value']
+    return _rebuild(key, models, build, timeout, stale_timeout)
@@ -0,0 +1,154 @@
+import datetime
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from .cache import bump_cache_version
+from .images import (
+    is_new_image, schedule_image_processing, stage_image, validate_image
+)
+from .models import (
+    FeePayment, Student, billing_month_of, fee_payments_bulk_saved,
+    record_ledger_entries
+)
+
+
+# Part of the duplicate key, converted to the model field types first
+KEY_FIELDS = ('grade', 'age')
+
+
+def _student_key(guardian, data):
+    return (guardian.pk, data.get('name'), data.get('grade'), data.get('age'))
+
+
+def enroll_students(guardian, students_list):
+    """
+    Create the students in `students_list` (and their optional
+    `initial_fee`) under `guardian`. Nothing is written when any row is
+    rejected, so the caller can report every problem at once.
+    """
+    return enroll_rows([(guardian, row) for row in students_list])
+
+
+def enroll_rows(entries, partial=False):
+    """
+    Create one student, and its optional `initial_fee`, for each
+    `(guardian, student data)` pair in `entries` with a fixed number of
+    queries.
+
+    All rows are validated first: a single query finds the students the
+    guardians already have, and duplicates inside the batch are caught
+    too. Returns `(created, errors)`, where `errors` holds one entry per
+    rejected row. Unless `partial` is set, nothing is written when any
+    row is rejected.
+
+    New photos, base64 or uploaded, are staged and processed by a
+    Celery task after the transaction commits.
+    """
+    existing = set(
+        Student.objects.filter(
+            guardian__in={guardian.pk for guardian, _ in entries},
+            name__in={row.get('name') for _, row in entries},
+        ).values_list('guardian_id', 'name', 'grade', 'age')
+    )
+
+    errors = []
+    seen = set()
+    students = []
+    fees = []
+    images = []
+    today = datetime.date.today()
+    for index, (guardian, row) in enumerate(entries):
+        student_data = dict(row)
+        fee_data = student_data.pop('initial_fee', None)
+        image_data = student_data.pop('student_image', None)
+
+        # Fix for age field error if it's passed as empty string
+        if student_data.get('age') == "":
+            student_data['age'] = None
+
+        # The key is compared with the stored values, so "13" from a
+        # form must become 13 first
+        try:
+            for field in KEY_FIELDS:
+                if field in student_data:
+                    student_data[field] = Student._meta.get_field(
+                        field
+                    ).to_python(student_data[field])
+        except ValidationError as e:
+            errors.append({
+                'index': index,
+                'name': student_data.get('name'),
+                'error': '; '.join(e.messages),
+            })
+            continue
+
+        key = _student_key(guardian, student_data)
+        if key in existing:
+            errors.append({
+                'index': index,
+                'name': student_data.get('name'),
+                'error': (
+                    f"Student with name {key[1]} age {key[3]} and "
+                    f"guardian is {guardian.name} already exists"
+                ),
+            })
+            continue
+        if key in seen:
+            errors.append({
+                'index': index,
+                'name': student_data.get('name'),
+                'error': 'Student appears more than once in this request',
+            })
+            continue
+        seen.add(key)
+
+        try:
+            if is_new_image(image_data):
+                validate_image(image_data)
+            student = Student(guardian=guardian, **student_data)
+            fee = FeePayment(**fee_data) if fee_data else None
+            if fee:
+                # bulk_create skips FeePayment.save()
+                fee.billing_month = billing_month_of(fee.month_paid_for)
+        except (TypeError, ValueError) as e:
+            errors.append({
+                'index': index,
+                'name': student_data.get('name'),
+                'error': str(e),
+            })
+            continue
+
+        if is_new_image(image_data):
+            images.append((student, image_data))
+        elif isinstance(image_data, str) and len(image_data) <= 255:
+            student.student_image = image_data or None
+        if fee:
+            # bulk_create skips the FeePayment signals that normally
+            # keep these columns in sync
+            student.latest_fee_status = fee.status
+            student.latest_fee_amount = fee.amount
+            student.latest_fee_date = today
+        students.append(student)
+        fees.append(fee)
+
+    if (errors and not partial) or not students:
+        return [], errors
+
+    Student.objects.bulk_create(students)
+    payments = []
+    for student, fee in zip(students, fees):
+        if fee:
+            fee.student = student
+            payments.append(fee)
+    if payments:
+        FeePayment.objects.bulk_create(payments)
+        record_ledger_entries(FeePayment, payments)
+        fee_payments_bulk_saved.send(sender=FeePayment, payments=payments)
+    for student, image_data in images:
+        schedule_image_processing(student.id, stage_image(image_data))
+
+    transaction.on_commit(lambda: bump_cache_version(Student))
+    if payments:
+        transaction.on_commit(lambda: bump_cache_version(FeePayment))
+    return students, errors
@@ -0,0 +1,367 @@
+import csv
+import io
+from collections import deque
+from decimal import Decimal, InvalidOperation
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .cache import bump_cache_version
+from .models import (
+    LEDGER_FIELDS, FeePayment, FeeSchedule, MonthlyLedger, Student,
+    apply_ledger_delta, billing_month_of, fee_payments_bulk_saved,
+    ledger_entry, move_ledger_entry, normalize_digits, sync_latest_fee
+)
+
+
+STATEMENT_COLUMNS = ['date', 'reference', 'amount']
+RECONCILE_CHUNK_SIZE = 500
+UNPAID_STATUSES = ('pending', 'late')
+# Phone numbers are matched on their last 10 digits, so 0300-1234567
+# and +92 300 1234567 are the same number
+PHONE_KEY_DIGITS = 10
+CNIC_DIGITS = 13
+
+
+# One pending payment per active student whose grade has an active
+# FeeSchedule. Students who already have a payment for the month are
+# skipped by the unique (student_id, billing_month) constraint. The new
+# payments are added to their MonthlyLedger row, at the key given by
+# ledger_entry(), in the same statement, which returns the students
+# that got one.
+CREATE_MONTHLY_FEES = """
+WITH created AS (
+    INSERT INTO {payment_table}
+        (student_id, amount, month_paid_for, billing_month, date_paid, status)
+    SELECT student.id, schedule.amount, %(month)s, %(month)s, %(today)s,
+        %(status)s
+    FROM {student_table} AS student
+    JOIN {schedule_table} AS schedule ON schedule.grade = student.grade
+    WHERE student.is_active AND schedule.is_active {grade_filter}
+    ON CONFLICT (student_id, billing_month) DO NOTHING
+    RETURNING student_id, amount
+), ledger AS (
+    INSERT INTO {ledger_table}
+        (month, source, category, status, total, entries, updated_at)
+    SELECT %(ledger_month)s, %(ledger_source)s, %(ledger_category)s,
+        %(ledger_status)s, SUM(amount), COUNT(*), %(now)s
+    FROM created
+    HAVING COUNT(*) > 0
+    ON CONFLICT (month, source, category, status) DO UPDATE
+    SET total = {ledger_table}.total + EXCLUDED.total,
+        entries = {ledger_table}.entries + EXCLUDED.entries,
+        updated_at = EXCLUDED.updated_at
+)
+SELECT student_id FROM created
+"""
+
+
+def upsert_fee_payment(payment, update_fields):
+    """
+    Insert `payment`, or, when its student already has a payment for
+    the same billing month, overwrite that payment's `update_fields`,
+    in one `INSERT ... ON CONFLICT (student_id, billing_month)` issued
+    by bulk_create(). Call it inside a transaction: concurrent upserts
+    of the same student and month are serialized until it commits.
+
+    `payment` is reloaded from the row that was written, so it holds
+    the merged values. bulk_create() sends no post_save, so the ledger,
+    the latest_fee_* columns, the caches and the fee alert are updated
+    here. Returns True when a new row was inserted.
+    """
+    payment.billing_month = billing_month_of(payment.month_paid_for)
+    ledger_fields = LEDGER_FIELDS[FeePayment]
+    # A row lock cannot cover a payment that does not exist yet, so two
+    # first posts for the same month would both read no previous
+    # payment. Upserts of the same student and month wait for each
+    # other on an advisory lock instead, held until the transaction
+    # ends; it takes no row lock, so it cannot deadlock with
+    # mark_payments_paid().
+    month = payment.billing_month
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT pg_advisory_xact_lock(%s, %s)',
+            [payment.student_id, month.year * 12 + month.month - 1],
+        )
+    # Keeps the values of the payment about to be overwritten for the
+    # ledger
+    previous = FeePayment.objects.select_for_update().filter(
+        student_id=payment.student_id, billing_month=payment.billing_month
+    ).values(*ledger_fields).first()
+
+    FeePayment.objects.bulk_create(
+        [payment],
+        update_conflicts=True,
+        unique_fields=['student', 'billing_month'],
+        # Rewriting student with itself changes nothing, but makes
+        # RETURNING hand back the id of the existing payment
+        update_fields=list(update_fields) or ['student'],
+    )
+    payment.refresh_from_db()
+
+    move_ledger_entry(
+        previous and ledger_entry(FeePayment, previous),
+        ledger_entry(FeePayment, {
+            field: getattr(payment, field) for field in ledger_fields
+        }),
+    )
+    sync_latest_fee(Student.objects.filter(pk=payment.student_id))
+    fee_payments_bulk_saved.send(sender=FeePayment, payments=[payment])
+    transaction.on_commit(lambda: bump_cache_version(FeePayment))
+    transaction.on_commit(lambda: bump_cache_version(Student))
+    return previous is None
+
+
+def create_monthly_fees(month, grades=None):
+    """
+    Create the pending fee payments of the billing month containing
+    `month` for every active student on a fee schedule, limited to
+    `grades` when given, with a single INSERT ... SELECT. Running it
+    again for the same month creates nothing. The students that got a
+    payment have their latest_fee_* columns synced afterwards.
+
+    No post_save is sent, so there is no per-payment notification.
+    Returns the number of payments created.
+    """
+    payment = {
+        'month_paid_for': billing_month_of(month),
+        'date_paid': timezone.localdate(),
+        'status': 'pending',
+        'amount': 0,
+    }
+    key, _ = ledger_entry(FeePayment, payment)
+    params = {
+        'month': payment['month_paid_for'],
+        'today': payment['date_paid'],
+        'status': payment['status'],
+        'now': timezone.now(),
+        **{f'ledger_{field}': value for field, value in key.items()},
+    }
+    grade_filter = ''
+    if grades:
+        grade_filter = 'AND student.grade = ANY(%(grades)s)'
+        params['grades'] = list(grades)
+    tables = {
+        f'{name}_table': connection.ops.quote_name(model._meta.db_table)
+        for name, model in (
+            ('payment', FeePayment), ('student', Student),
+            ('schedule', FeeSchedule), ('ledger', MonthlyLedger),
+        )
+    }
+
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                CREATE_MONTHLY_FEES.format(
+                    grade_filter=grade_filter, **tables
+                ),
+                params
+            )
+            student_ids = [row[0] for row in cursor.fetchall()]
+        if student_ids:
+            sync_latest_fee(Student.objects.filter(pk__in=student_ids))
+            transaction.on_commit(lambda: bump_cache_version(FeePayment))
+            transaction.on_commit(lambda: bump_cache_version(Student))
+    return len(student_ids)
+
+
+def _statement_keys(digits):
+    """
+    Index keys for a CNIC or phone number given as digits. A full CNIC
+    is only matched whole: its last 10 digits could be someone's phone.
+    """
+    if len(digits) == CNIC_DIGITS:
+        return [digits]
+    return [key for key in (digits, digits[-PHONE_KEY_DIGITS:]) if key]
+
+
+def build_unpaid_index():
+    """
+    Index every pending or late fee payment by `(digits, amount)`, where
+    digits is its guardian's CNIC or phone number, in one query. Each
+    key holds a deque of payments, oldest billing month first; the CNIC
+    and phone keys of a payment share the deque, so a payment claimed
+    through one can no longer be matched through the other.
+    """
+    index = {}
+    payments = FeePayment.objects.filter(
+        status__in=UNPAID_STATUSES, student__guardian__isnull=False
+    ).values(
+        'id', 'student_id', 'amount', 'billing_month',
+        'student__guardian_id', 'student__guardian__cnic_digits',
+        'student__guardian__phone_digits',
+    ).order_by('billing_month', 'id')
+
+    queues = {}
+    for payment in payments:
+        guardian = payment['student__guardian_id']
+        queue = queues.get((guardian, payment['amount']))
+        if queue is None:
+            queue = queues[(guardian, payment['amount'])] = deque()
+            keys = {
+                payment['student__guardian__cnic_digits'],
+                payment['student__guardian__phone_digits'][
+                    -PHONE_KEY_DIGITS:
+                ],
+            }
+            for key in keys - {''}:
+                index[(key, payment['amount'])] = queue
+        queue.append(payment)
+    return index
+
+
+def parse_statement_amount(value):
+    try:
+        amount = Decimal((value or '').replace(',', '').strip())
+    except InvalidOperation:
+        raise ValueError('amount must be a number')
+    if amount <= 0:
+        raise ValueError('Not a credit')
+    return amount
+
+
+def match_statement(rows, index):
+    """
+    Match `(line number, csv row)` statement rows to the payments in
+    `index`. Returns `(matches, unmatched)`: one `{'line', 'date',
+    'reference', 'amount', 'payment'}` per matched row, and one
+    `{'line', 'date', 'reference', 'amount', 'error'}` per row left
+    over.
+    """
+    matches = []
+    unmatched = []
+    for line, row in rows:
+        date = (row.get('date') or '').strip()
+        reference = (row.get('reference') or '').strip()
+        amount = (row.get('amount') or '').strip()
+        try:
+            if not reference:
+                raise ValueError('reference is required')
+            amount = parse_statement_amount(amount)
+            queue = next((
+                index[(key, amount)]
+                for key in _statement_keys(normalize_digits(reference))
+                if index.get((key, amount))
+            ), None)
+            if queue is None:
+                raise ValueError(
+                    'No pending payment for this CNIC/phone and amount'
+                )
+        except ValueError as e:
+            unmatched.append({
+                'line': line, 'date': date, 'reference': reference,
+                'amount': str(amount), 'error': str(e),
+            })
+            continue
+        matches.append({
+            'line': line, 'date': date, 'reference': reference,
+            'amount': str(amount), 'payment': queue.popleft(),
+        })
+    return matches, unmatched
+
+
+def mark_payments_paid(payment_ids):
+    """
+    Mark the payments in `payment_ids` that are still unpaid as paid
+    with a single UPDATE, keeping the ledger and latest_fee_* columns in
+    step. No post_save is sent, so there is no per-payment notification.
+    Returns the ids that were updated.
+    """
+    with transaction.atomic():
+        payments = list(
+            FeePayment.objects.select_for_update().filter(
+                pk__in=payment_ids, status__in=UNPAID_STATUSES
+            ).values('id', 'student_id', *LEDGER_FIELDS[FeePayment])
+        )
+        if not payments:
+            return set()
+        updated = {payment['id'] for payment in payments}
+        FeePayment.objects.filter(pk__in=updated).update(status='paid')
+
+        deltas = {}
+        for payment in payments:
+            for values, sign in (
+                (payment, -1), ({**payment, 'status': 'paid'}, 1)
+            ):
+                entry = ledger_entry(FeePayment, values)
+                if entry is None:
+                    continue
+                key, amount = entry
+                frozen = tuple(sorted(key.items()))
+                total, count = deltas.get(frozen, (0, 0))
+                deltas[frozen] = (total + sign * amount, count + sign)
+        for frozen, (amount, count) in deltas.items():
+            apply_ledger_delta(dict(frozen), amount, count)
+
+        sync_latest_fee(Student.objects.filter(
+            pk__in={payment['student_id'] for payment in payments}
+        ))
+        transaction.on_commit(lambda: bump_cache_version(FeePayment))
+        transaction.on_commit(lambda: bump_cache_version(Student))
+    return updated
+
+
+def reconcile_statement(upload, dry_run=False):
+    """
+    Match a bank statement CSV (STATEMENT_COLUMNS; `reference` holds the
+    guardian's CNIC or phone number) to the unpaid fee payments by
+    CNIC/phone and amount, and mark the matched payments paid
+    RECONCILE_CHUNK_SIZE at a time. When a family has several unpaid
+    payments of the same amount, the oldest month is settled first.
+    With `dry_run` nothing is written.
+
+    Returns the match report.
+    """
+    reader = csv.DictReader(
+        io.TextIOWrapper(upload, encoding='utf-8-sig', newline='')
+    )
+    missing = [
+        column for column in ('reference', 'amount')
+        if column not in (reader.fieldnames or [])
+    ]
+    if missing:
+        raise ValueError(f"Missing columns: {', '.join(missing)}")
+
+    rows = [(reader.line_num, row) for row in reader]
+    matches, unmatched = match_statement(rows, build_unpaid_index())
+
+    if not dry_run:
+        applied = []
+        for start in range(0, len(matches), RECONCILE_CHUNK_SIZE):
+            chunk = matches[start:start + RECONCILE_CHUNK_SIZE]
+            updated = mark_payments_paid(
+                [match['payment']['id'] for match in chunk]
+            )
+            for match in chunk:
+                if match['payment']['id'] in updated:
+                    applied.append(match)
+                else:
+                    unmatched.append({
+                        'line': match['line'],
+                        'date': match['date'],
+                        'reference': match['reference'],
+                        'amount': match['amount'],
+                        'error': 'Payment was changed in the meantime',
+                    })
+        matches = applied
+        unmatched.sort(key=lambda row: row['line'])
+
+    return {
+        'rows': len(rows),
+        'matched': len(matches),
+        'unmatched': len(unmatched),
+        'dry_run': dry_run,
+        'matches': [
+            {
+                'line': match['line'],
+                'date': match['date'],
+                'reference': match['reference'],
+                'amount': match['amount'],
+                'payment': match['payment']['id'],
+                'student': match['payment']['student_id'],
+                'month': match['payment']['billing_month'],
+            }
+            for match in matches
+        ],
+        'errors': unmatched,
+    }
@@ -0,0 +1,112 @@
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+
+from .cache import bump_cache_version
+from .models import Guardian, normalize_digits
+
+
+GUARDIAN_UPSERT_CHUNK_SIZE = 1000
+GUARDIAN_UPSERT_ATTEMPTS = 2
+GUARDIAN_FIELDS = ['name', 'cnic', 'phone_number', 'address']
+
+
+def upsert_guardians(guardians_data, update_fields=()):
+    """
+    Create or update the guardians in `guardians_data` (dicts with
+    `cnic`, `phone_number`, and optionally `name` and `address`) with
+    one `INSERT ... ON CONFLICT (cnic) DO UPDATE` per chunk.
+
+    Guardians whose CNIC already exists only get `update_fields`
+    overwritten; with no `update_fields` they are left as they are.
+    Records whose phone number belongs to a guardian with another CNIC
+    are rejected up front, as are repeated CNICs or phone numbers in
+    the batch, so the insert does not hit the unique constraints. A
+    guardian written concurrently can still take a phone number after
+    it was checked; the insert then fails, and the batch is checked
+    and written again, which rejects the records that conflict with it.
+
+    Returns `(guardians, errors)`: {cnic: Guardian} for the records that
+    were written, as stored, and one `{'index', 'cnic', 'error'}` per
+    rejected record.
+    """
+    for _ in range(GUARDIAN_UPSERT_ATTEMPTS):
+        try:
+            with transaction.atomic():
+                return _upsert_guardians(guardians_data, update_fields)
+        except IntegrityError:
+            pass
+    return {}, [
+        {
+            'index': index, 'cnic': data.get('cnic'),
+            'error': 'Guardian was changed in the meantime',
+        }
+        for index, data in enumerate(guardians_data)
+    ]
+
+
+def _upsert_guardians(guardians_data, update_fields):
+    update_fields = [f for f in update_fields if f in GUARDIAN_FIELDS]
+    updates_phone = 'phone_number' in update_fields
+
+    cnics = {data.get('cnic') for data in guardians_data}
+    phones = {data.get('phone_number') for data in guardians_data}
+    existing_cnics = set()
+    phone_owners = {}
+    for cnic, phone_number in Guardian.objects.filter(
+        Q(cnic__in=cnics) | Q(phone_number__in=phones)
+    ).values_list('cnic', 'phone_number'):
+        if cnic in cnics:
+            existing_cnics.add(cnic)
+        phone_owners[phone_number] = cnic
+
+    errors = []
+    guardians = {}
+    for index, data in enumerate(guardians_data):
+        cnic = data.get('cnic')
+        phone_number = data.get('phone_number')
+
+        error = None
+        if not cnic or not phone_number:
+            error = 'cnic and phone_number are required'
+        elif cnic in guardians:
+            error = 'Guardian appears more than once in this request'
+        # The phone number is only written for new guardians, or when
+        # it is one of the update_fields
+        writes_phone = cnic not in existing_cnics or updates_phone
+        if not error and writes_phone:
+            if phone_owners.get(phone_number, cnic) != cnic:
+                error = (
+                    f'Phone number {phone_number} belongs to another '
+                    'guardian'
+                )
+            else:
+                phone_owners[phone_number] = cnic
+        if error:
+            errors.append({'index': index, 'cnic': cnic, 'error': error})
+            continue
+
+        guardians[cnic] = Guardian(
+            **{field: data.get(field) for field in GUARDIAN_FIELDS},
+            # bulk_create skips Guardian.save()
+            cnic_digits=normalize_digits(cnic),
+            phone_digits=normalize_digits(phone_number),
+        )
+
+    if guardians:
+        if updates_phone:
+            update_fields.append('phone_digits')
+        Guardian.objects.bulk_create(
+            guardians.values(),
+            batch_size=GUARDIAN_UPSERT_CHUNK_SIZE,
+            update_conflicts=True,
+            unique_fields=['cnic'],
+            # Rewriting cnic with itself changes nothing, but makes
+            # RETURNING hand back the id of an existing guardian
+            update_fields=update_fields or ['cnic'],
+        )
+        # Existing guardians keep the fields that were not updated
+        guardians = Guardian.objects.in_bulk(
+            list(guardians), field_name='cnic'
+        )
+        transaction.on_commit(lambda: bump_cache_version(Guardian))
+    return guardians, errors
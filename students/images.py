@@ -0,0 +1,184 @@
+import base64
+import binascii
+import os
+import uuid
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import UploadedFile
+from django.db import transaction
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+
+STAGING_DIR = 'students_images/staging/'
+ALLOWED_FORMATS = {'jpeg', 'jpg', 'png', 'webp', 'gif'}
+MAX_IMAGE_BYTES = 10 * 1024 * 1024
+MAX_IMAGE_PIXELS = 40_000_000
+MAX_DIMENSION = 1600
+JPEG_QUALITY = 85
+# Student field -> longest side in pixels
+THUMBNAIL_SIZES = {
+    'student_image_64': 64,
+    'student_image_256': 256,
+}
+THUMBNAIL_QUALITY = 80
+
+
+class InvalidImage(ValueError):
+    pass
+
+
+def is_base64_image(value):
+    return isinstance(value, str) and value.startswith('data:image')
+
+
+def is_new_image(value):
+    """A base64 data URL or a multipart upload, as opposed to a path."""
+    return is_base64_image(value) or isinstance(value, UploadedFile)
+
+
+def validate_base64_image(data):
+    """
+    Cheap checks on a `data:image/...;base64,` URL that need no
+    decoding: the declared format and the size of the payload.
+    """
+    header, separator, payload = data.partition(';base64,')
+    if not separator or not payload:
+        raise InvalidImage('Invalid base64 image')
+    image_format = header.split('/')[-1].lower()
+    if image_format not in ALLOWED_FORMATS:
+        raise InvalidImage(f'Unsupported image format: {image_format}')
+    if len(payload) * 3 // 4 > MAX_IMAGE_BYTES:
+        raise InvalidImage('Image is larger than 10 MB')
+    return payload
+
+
+def _upload_extension(upload):
+    return os.path.splitext(upload.name or '')[1].lstrip('.').lower()
+
+
+def validate_image(value):
+    """
+    validate_base64_image() for data URLs; for uploads the same checks
+    on the file extension and size, without reading the file.
+    """
+    if not isinstance(value, UploadedFile):
+        validate_base64_image(value)
+        return
+    extension = _upload_extension(value)
+    if extension not in ALLOWED_FORMATS:
+        raise InvalidImage(f'Unsupported image format: {extension}')
+    if value.size > MAX_IMAGE_BYTES:
+        raise InvalidImage('Image is larger than 10 MB')
+
+
+def stage_image(value):
+    """
+    Write a new image to the staging area as it came in and return the
+    staged file name. Uploads spooled to a temporary file by Django's
+    upload handler are moved into place, not copied; base64 payloads
+    are written undecoded. Decoding is left to the
+    process_student_image task.
+    """
+    validate_image(value)
+    if isinstance(value, UploadedFile):
+        return default_storage.save(
+            f'{STAGING_DIR}{uuid.uuid4()}.{_upload_extension(value)}', value
+        )
+    payload = validate_base64_image(value)
+    return default_storage.save(
+        f'{STAGING_DIR}{uuid.uuid4()}.b64',
+        ContentFile(payload.encode('ascii'))
+    )
+
+
+def schedule_image_processing(student_id, staged_name):
+    """Process the staged image once the student row is committed."""
+    from .tasks import process_student_image
+
+    transaction.on_commit(
+        lambda: process_student_image.delay(student_id, staged_name)
+    )
+
+
+def clean_staged_image(staged_name):
+    """
+    Decode and validate a staged image (base64 payloads are stored
+    with a .b64 extension, uploads as is), then re-encode it without its
+    EXIF metadata, scaled down to MAX_DIMENSION. The EXIF orientation
+    is applied to the pixels first so the photo stays upright.
+    Returns a ContentFile ready to assign to an ImageField.
+    """
+    with default_storage.open(staged_name, 'rb') as staged:
+        raw = staged.read()
+    try:
+        if staged_name.endswith('.b64'):
+            raw = base64.b64decode(raw, validate=True)
+        with Image.open(BytesIO(raw)) as probe:
+            probe.verify()
+        image = Image.open(BytesIO(raw))
+    except Image.DecompressionBombError:
+        # Raised by Image.open() above twice Image.MAX_IMAGE_PIXELS
+        raise InvalidImage('Image dimensions are too large')
+    except (binascii.Error, UnidentifiedImageError, OSError, SyntaxError):
+        raise InvalidImage('Invalid base64 image')
+    if (image.format or '').lower() not in ALLOWED_FORMATS:
+        raise InvalidImage(f'Unsupported image format: {image.format}')
+    if image.width * image.height > MAX_IMAGE_PIXELS:
+        raise InvalidImage('Image dimensions are too large')
+
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail((MAX_DIMENSION, MAX_DIMENSION))
+
+    output = BytesIO()
+    if image.mode in ('RGBA', 'LA') or 'transparency' in image.info:
+        image.convert('RGBA').save(output, format='PNG', optimize=True)
+        extension = 'png'
+    else:
+        image.convert('RGB').save(
+            output, format='JPEG', quality=JPEG_QUALITY, optimize=True
+        )
+        extension = 'jpg'
+    return ContentFile(
+        output.getvalue(), name=f'student_{uuid.uuid4()}.{extension}'
+    )
+
+
+def render_thumbnails(raw):
+    """
+    Render the WebP variants in THUMBNAIL_SIZES from the image bytes
+    `raw` and return them as {field name: bytes}. Touches neither the
+    database nor storage, so the backfill can run it in a process pool.
+    """
+    thumbnails = {}
+    with Image.open(BytesIO(raw)) as image:
+        image = ImageOps.exif_transpose(image)
+        has_alpha = (
+            image.mode in ('RGBA', 'LA') or 'transparency' in image.info
+        )
+        image = image.convert('RGBA' if has_alpha else 'RGB')
+        for field, size in THUMBNAIL_SIZES.items():
+            thumbnail = image.copy()
+            thumbnail.thumbnail((size, size))
+            output = BytesIO()
+            thumbnail.save(output, format='WEBP', quality=THUMBNAIL_QUALITY)
+            thumbnails[field] = output.getvalue()
+    return thumbnails
+
+
+def save_thumbnails(student, thumbnails):
+    """
+    Write rendered thumbnails to storage and set them on `student`
+    without saving it. Returns the field values for an update().
+    """
+    stem = uuid.uuid4()
+    values = {}
+    for field, data in thumbnails.items():
+        size = THUMBNAIL_SIZES[field]
+        image_field = getattr(student, field)
+        image_field.save(
+            f'student_{stem}_{size}.webp', ContentFile(data), save=False
+        )
+        values[field] = image_field.name
+    return values
@@ -0,0 +1,192 @@
+import csv
+import io
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .enrollment import enroll_rows
+from .guardians import upsert_guardians
+from .models import FeePayment, ImportStatus, Student, StudentImportJob
+
+
+IMPORT_CHUNK_SIZE = 500
+MAX_REPORTED_ERRORS = 200
+
+IMPORT_COLUMNS = [
+    'guardian_name', 'guardian_cnic', 'guardian_phone', 'guardian_address',
+    'student_name', 'age', 'grade', 'date_joined',
+    'fee_amount', 'fee_month', 'fee_status',
+]
+REQUIRED_COLUMNS = ['guardian_cnic', 'guardian_phone', 'student_name']
+
+
+def _value(row, column):
+    return (row.get(column) or '').strip()
+
+
+def _date(row, column):
+    value = _value(row, column)
+    if not value:
+        return None
+    parsed = parse_date(value)
+    if parsed is None:
+        raise ValueError(f'{column} must be a date (YYYY-MM-DD)')
+    return parsed
+
+
+def parse_row(row):
+    """
+    Turn one CSV row into `(guardian data, student data)` in the shape
+    taken by BulkEnrollStudentAPIView. Raises ValueError on bad input.
+    """
+    for column in REQUIRED_COLUMNS:
+        if not _value(row, column):
+            raise ValueError(f'{column} is required')
+
+    age = _value(row, 'age')
+    try:
+        age = int(age) if age else None
+    except ValueError:
+        raise ValueError('age must be a whole number')
+
+    grade = _value(row, 'grade') or None
+    if grade and grade not in dict(Student.CLASS_CHOICES):
+        raise ValueError(f'Unknown grade: {grade}')
+
+    guardian = {
+        'name': _value(row, 'guardian_name') or None,
+        'cnic': _value(row, 'guardian_cnic'),
+        'phone_number': _value(row, 'guardian_phone'),
+        'address': _value(row, 'guardian_address') or None,
+    }
+    student = {
+        'name': _value(row, 'student_name'),
+        'age': age,
+        'grade': grade,
+        'date_joined': _date(row, 'date_joined'),
+    }
+
+    amount = _value(row, 'fee_amount')
+    if amount:
+        try:
+            amount = Decimal(amount)
+        except InvalidOperation:
+            raise ValueError('fee_amount must be a number')
+        fee_status = _value(row, 'fee_status') or 'pending'
+        if fee_status not in dict(FeePayment.STATUS_CHOICES):
+            raise ValueError(f'Unknown fee_status: {fee_status}')
+        student['initial_fee'] = {
+            'amount': amount,
+            'month_paid_for': _date(row, 'fee_month'),
+            'status': fee_status,
+        }
+    return guardian, student
+
+
+def get_or_create_guardians(guardians_data):
+    """
+    Return {cnic: Guardian} for the guardians in `guardians_data`,
+    creating the missing ones with upsert_guardians(). Existing
+    guardians are left as they are. A guardian that cannot be created,
+    e.g. because another guardian already has its phone number, is
+    missing from the result.
+    """
+    guardians, _ = upsert_guardians(list(guardians_data.values()))
+    return guardians
+
+
+def import_chunk(rows):
+    """
+    Import `(line number, csv row)` pairs in one transaction. Returns
+    the number of students created and a list of `{'line', 'error'}`
+    for the rows that were rejected.
+    """
+    errors = []
+    parsed = []
+    for line, row in rows:
+        try:
+            parsed.append((line, *parse_row(row)))
+        except ValueError as e:
+            errors.append({'line': line, 'error': str(e)})
+
+    with transaction.atomic():
+        guardians = get_or_create_guardians({
+            guardian['cnic']: guardian for _, guardian, _ in parsed
+        })
+
+        entries = []
+        lines = []
+        for line, guardian, student in parsed:
+            if guardian['cnic'] not in guardians:
+                errors.append({
+                    'line': line,
+                    'error': (
+                        f"Guardian {guardian['cnic']} could not be "
+                        "created, its phone number is already in use"
+                    ),
+                })
+                continue
+            entries.append((guardians[guardian['cnic']], student))
+            lines.append(line)
+
+        created, rejected = enroll_rows(entries, partial=True)
+        for error in rejected:
+            errors.append({
+                'line': lines[error['index']], 'error': error['error']
+            })
+
+    errors.sort(key=lambda error: error['line'])
+    return len(created), errors
+
+
+def run_import(job):
+    """
+    Stream `job.file` through import_chunk() IMPORT_CHUNK_SIZE rows at
+    a time and record progress on the job after every chunk. Only one
+    chunk is held in memory, whatever the size of the file.
+    """
+    StudentImportJob.objects.filter(pk=job.pk).update(
+        status=ImportStatus.RUNNING, started_at=timezone.now()
+    )
+    reported = []
+    with job.file.open('rb') as raw:
+        reader = csv.DictReader(
+            io.TextIOWrapper(raw, encoding='utf-8-sig', newline='')
+        )
+        fieldnames = reader.fieldnames or []
+        missing = [c for c in REQUIRED_COLUMNS if c not in fieldnames]
+        if missing:
+            StudentImportJob.objects.filter(pk=job.pk).update(
+                status=ImportStatus.FAILED,
+                message=f"Missing columns: {', '.join(missing)}",
+                finished_at=timezone.now()
+            )
+            return
+
+        rows = ((reader.line_num, row) for row in reader)
+        while True:
+            chunk = list(islice(rows, IMPORT_CHUNK_SIZE))
+            if not chunk:
+                break
+            try:
+                created, errors = import_chunk(chunk)
+            except Exception as e:
+                created = 0
+                errors = [{'line': line, 'error': str(e)} for line, _ in chunk]
+
+            room = MAX_REPORTED_ERRORS - len(reported)
+            if room > 0 and errors:
+                reported.extend(errors[:room])
+            StudentImportJob.objects.filter(pk=job.pk).update(
+                rows_done=F('rows_done') + created,
+                rows_failed=F('rows_failed') + len(errors),
+                errors=reported,
+            )
+
+    StudentImportJob.objects.filter(pk=job.pk).update(
+        status=ImportStatus.COMPLETED, finished_at=timezone.now()
+    )
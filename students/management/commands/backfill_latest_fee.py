@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from students.cache import bump_cache_version
+from students.models import Student, sync_latest_fee
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill Student.latest_fee_status, latest_fee_amount and "
+        "latest_fee_date from each student's most recent payment."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help='Number of students updated per statement'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        ids = Student.objects.order_by('id').values_list('id', flat=True)
+
+        updated = 0
+        last_id = 0
+        while True:
+            batch = list(ids.filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            updated += sync_latest_fee(
+                Student.objects.filter(id__gte=batch[0], id__lte=batch[-1])
+            )
+            last_id = batch[-1]
+
+        bump_cache_version(Student)
+        self.stdout.write(self.style.SUCCESS(
+            f"Updated latest fee columns for {updated} students"
+        ))
@@ -0,0 +1,42 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from students.fees import create_monthly_fees
+from students.models import Student
+
+
+class Command(BaseCommand):
+    help = (
+        "Create the pending fee payment of a month for every active "
+        "student whose grade has a fee schedule. Students who already "
+        "have a payment for that month are skipped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--month',
+            help='Billing month as YYYY-MM (default: the current month)'
+        )
+        parser.add_argument(
+            '--grade', action='append', dest='grades',
+            choices=[grade for grade, _ in Student.CLASS_CHOICES],
+            help='Only this grade; can be repeated'
+        )
+
+    def handle(self, *args, **options):
+        month = timezone.localdate()
+        if options['month']:
+            try:
+                month = datetime.datetime.strptime(
+                    options['month'], '%Y-%m'
+                ).date()
+            except ValueError:
+                raise CommandError('--month must be given as YYYY-MM')
+
+        created = create_monthly_fees(month, grades=options['grades'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {created} pending fee payments for "
+            f"{month.strftime('%B %Y')}"
+        ))
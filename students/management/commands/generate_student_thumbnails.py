@@ -0,0 +1,81 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from students.cache import bump_cache_version
+from students.images import render_thumbnails, save_thumbnails
+from students.models import Student
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate the 64px and 256px WebP thumbnails for students whose "
+        "photo has none. Images are rendered in a process pool."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=None,
+            help='Number of worker processes (default: CPU count)'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=200,
+            help='Number of images submitted to the pool at a time'
+        )
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Regenerate thumbnails that already exist'
+        )
+
+    def handle(self, *args, **options):
+        students = Student.objects.exclude(
+            student_image=''
+        ).exclude(student_image__isnull=True).order_by('id')
+        if not options['all']:
+            students = students.filter(
+                Q(student_image_256__isnull=True) | Q(student_image_256='')
+            )
+
+        done = failed = 0
+        last_id = 0
+        with ProcessPoolExecutor(max_workers=options['workers']) as pool:
+            while True:
+                batch = list(
+                    students.filter(id__gt=last_id)[:options['batch_size']]
+                )
+                if not batch:
+                    break
+                last_id = batch[-1].id
+
+                # Storage reads and database writes stay in this
+                # process; workers only get bytes in and bytes out.
+                futures = {}
+                for student in batch:
+                    try:
+                        with student.student_image.open('rb') as image:
+                            raw = image.read()
+                    except (OSError, ValueError) as e:
+                        failed += 1
+                        self.stderr.write(f"Student {student.id}: {e}")
+                        continue
+                    futures[pool.submit(render_thumbnails, raw)] = student
+
+                for future in as_completed(futures):
+                    student = futures[future]
+                    try:
+                        thumbnails = future.result()
+                    except Exception as e:
+                        failed += 1
+                        self.stderr.write(f"Student {student.id}: {e}")
+                        continue
+                    Student.objects.filter(pk=student.pk).update(
+                        **save_thumbnails(student, thumbnails)
+                    )
+                    done += 1
+
+        if done:
+            bump_cache_version(Student)
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated thumbnails for {done} students ({failed} failed)"
+        ))
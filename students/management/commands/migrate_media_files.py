@@ -0,0 +1,98 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from students.cache import bump_cache_version
+from students.models import FeePayment, SalaryPayment
+from students.storage import is_digest_name
+
+
+# Model -> FileField moved to ContentAddressedStorage
+CONTENT_ADDRESSED_FIELDS = [
+    (FeePayment, 'screenshot'),
+    (SalaryPayment, 'salary_slip'),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Move the existing fee screenshots and salary slips into the "
+        "content-addressed layout, storing identical files once, and "
+        "point the records at the new names."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Number of records updated per query'
+        )
+        parser.add_argument(
+            '--keep-originals', action='store_true',
+            help='Leave the old files in place after moving them'
+        )
+
+    def handle(self, *args, **options):
+        moved = failed = 0
+        blobs = set()
+        # Old name -> storage, deleted once every record has moved
+        originals = {}
+        # Old names still referenced by a record that failed to move
+        kept = set()
+
+        for model, field_name in CONTENT_ADDRESSED_FIELDS:
+            storage = model._meta.get_field(field_name).storage
+            records = model.objects.exclude(
+                Q(**{field_name: ''}) | Q(**{f'{field_name}__isnull': True})
+            ).only('id', field_name).order_by('id')
+
+            changed = False
+            last_id = 0
+            while True:
+                batch = list(
+                    records.filter(id__gt=last_id)[:options['batch_size']]
+                )
+                if not batch:
+                    break
+                last_id = batch[-1].id
+
+                updated = []
+                for record in batch:
+                    old_name = getattr(record, field_name).name
+                    if is_digest_name(old_name):
+                        blobs.add(old_name)
+                        continue
+                    try:
+                        with storage.open(old_name, 'rb') as original:
+                            new_name = storage.save(old_name, original)
+                    except OSError as e:
+                        failed += 1
+                        kept.add(old_name)
+                        self.stderr.write(
+                            f"{model.__name__} {record.id}: {e}"
+                        )
+                        continue
+                    setattr(record, field_name, new_name)
+                    updated.append(record)
+                    originals[old_name] = storage
+                    blobs.add(new_name)
+
+                if updated:
+                    # bulk_update sends no signals; the fields are
+                    # renamed, nothing the ledger or latest_fee_* track
+                    model.objects.bulk_update(updated, [field_name])
+                    moved += len(updated)
+                    changed = True
+
+            if changed:
+                bump_cache_version(model)
+
+        removed = 0
+        if not options['keep_originals']:
+            for old_name, storage in originals.items():
+                if old_name not in kept and old_name not in blobs:
+                    storage.delete(old_name)
+                    removed += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Moved {moved} files into {len(blobs)} blobs, removed "
+            f"{removed} originals ({failed} failed)"
+        ))
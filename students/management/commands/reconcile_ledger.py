@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from students.cache import bump_cache_version
+from students.models import Expense, FeePayment, reconcile_ledger
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the MonthlyLedger totals from every FeePayment and "
+        "Expense, fixing any drift in the incrementally kept rows."
+    )
+
+    def handle(self, *args, **options):
+        rows = reconcile_ledger()
+        # The finance endpoints cache their ledger reads under these
+        bump_cache_version(FeePayment)
+        bump_cache_version(Expense)
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt the monthly ledger ({rows} rows)"
+        ))
@@ -0,0 +1,28 @@
+# Generated by Django 6.0.2 on 2026-10-17 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('students', '0008_teacherattendance'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='student',
+            name='latest_fee_amount',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=8, null=True),
+        ),
+        migrations.AddField(
+            model_name='student',
+            name='latest_fee_date',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='student',
+            name='latest_fee_status',
+            field=models.CharField(blank=True, db_index=True, max_length=10, null=True),
+        ),
+    ]
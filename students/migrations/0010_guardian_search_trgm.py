@@ -0,0 +1,60 @@
+# Generated by Django 6.0.2 on 2026-10-17 10:05
+
+import django.contrib.postgres.indexes
+import django.db.models.functions.text
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+
+
+def fill_digits(apps, schema_editor):
+    Guardian = apps.get_model('students', 'Guardian')
+
+    def digits_only(field):
+        return models.Func(
+            models.F(field), models.Value(r'\D'), models.Value(''),
+            models.Value('g'), function='regexp_replace',
+            output_field=models.CharField(),
+        )
+
+    Guardian.objects.update(
+        cnic_digits=digits_only('cnic'),
+        phone_digits=digits_only('phone_number'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('students', '0009_student_latest_fee_columns'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='guardian',
+            name='cnic_digits',
+            field=models.CharField(blank=True, default='', max_length=15),
+        ),
+        migrations.AddField(
+            model_name='guardian',
+            name='phone_digits',
+            field=models.CharField(blank=True, default='', max_length=15),
+        ),
+        migrations.RunPython(fill_digits, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='guardian',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('name'), name='gin_trgm_ops'), name='guardian_name_trgm'),
+        ),
+        migrations.AddIndex(
+            model_name='guardian',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['cnic_digits'], name='guardian_cnic_digits_trgm', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='guardian',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['phone_digits'], name='guardian_phone_digits_trgm', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='student',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('name'), name='gin_trgm_ops'), name='student_name_trgm'),
+        ),
+    ]
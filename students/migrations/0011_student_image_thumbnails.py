@@ -0,0 +1,23 @@
+# Generated by Django 6.0.2 on 2026-10-17 11:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('students', '0010_guardian_search_trgm'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='student',
+            name='student_image_256',
+            field=models.ImageField(blank=True, null=True, upload_to='students_images/thumbnails/'),
+        ),
+        migrations.AddField(
+            model_name='student',
+            name='student_image_64',
+            field=models.ImageField(blank=True, null=True, upload_to='students_images/thumbnails/'),
+        ),
+    ]
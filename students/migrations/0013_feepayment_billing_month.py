@@ -0,0 +1,45 @@
+# Generated by Django 6.0.2 on 2026-10-17 11:20
+
+from django.db import migrations, models
+
+
+# Older duplicates for the same student and month keep a NULL
+# billing_month, so the unique constraint can be added; the newest
+# payment is the one the fee form used to update.
+FILL_BILLING_MONTH = """
+UPDATE students_feepayment AS payment
+SET billing_month = newest.billing_month
+FROM (
+    SELECT DISTINCT ON (student_id, date_trunc('month', month_paid_for))
+        id, date_trunc('month', month_paid_for)::date AS billing_month
+    FROM students_feepayment
+    WHERE student_id IS NOT NULL AND month_paid_for IS NOT NULL
+    ORDER BY student_id, date_trunc('month', month_paid_for),
+        date_paid DESC, id DESC
+) AS newest
+WHERE payment.id = newest.id
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('students', '0012_studentimportjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='feepayment',
+            name='billing_month',
+            field=models.DateField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunSQL(FILL_BILLING_MONTH, migrations.RunSQL.noop),
+        migrations.AddIndex(
+            model_name='feepayment',
+            index=models.Index(fields=['billing_month'], name='fee_payment_month_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='feepayment',
+            constraint=models.UniqueConstraint(fields=('student', 'billing_month'), name='unique_fee_payment_per_month'),
+        ),
+    ]
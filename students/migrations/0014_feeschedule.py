@@ -0,0 +1,24 @@
+# Generated by Django 6.0.2 on 2026-10-17 11:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('students', '0013_feepayment_billing_month'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeeSchedule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('grade', models.CharField(choices=[('Nursery', 'Nursery'), ('Prep', 'Prep'), ('1', '1st Grade'), ('2', '2nd Grade'), ('3', '3rd Grade'), ('4', '4th Grade'), ('5', '5th Grade'), ('6', '6th Grade'), ('7', '7th Grade'), ('8', '8th Grade'), ('9', '9th Grade'), ('10', '10th Grade'), ('11', '1st Year'), ('12', '2nd Year')], max_length=10, unique=True)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=8)),
+                ('is_active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
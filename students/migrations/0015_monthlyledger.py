@@ -0,0 +1,47 @@
+# Generated by Django 6.0.2 on 2026-10-17 12:25
+
+from django.db import migrations, models
+
+
+# Same totals as students.models.reconcile_ledger()
+FILL_LEDGER = """
+INSERT INTO students_monthlyledger
+    (month, source, category, status, total, entries, updated_at)
+SELECT date_trunc('month', COALESCE(month_paid_for, date_paid))::date,
+    'fee', '', COALESCE(status, ''), SUM(amount), COUNT(*), now()
+FROM students_feepayment
+GROUP BY 1, 4
+UNION ALL
+SELECT date_trunc('month', expense_date)::date,
+    'expense', COALESCE(category, ''), COALESCE(status, ''),
+    COALESCE(SUM(amount), 0), COUNT(*), now()
+FROM students_expense
+WHERE expense_date IS NOT NULL
+GROUP BY 1, 3, 4
+"""
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('students', '0014_feeschedule'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MonthlyLedger',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('source', models.CharField(choices=[('fee', 'Fee payment'), ('expense', 'Expense')], max_length=10)),
+                ('category', models.CharField(blank=True, default='', max_length=20)),
+                ('status', models.CharField(blank=True, default='', max_length=10)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('entries', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('month', 'source', 'category', 'status'), name='unique_monthly_ledger_row')],
+            },
+        ),
+        migrations.RunSQL(FILL_LEDGER, migrations.RunSQL.noop),
+    ]
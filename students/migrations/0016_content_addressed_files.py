@@ -0,0 +1,24 @@
+# Generated by Django 6.0.2 on 2026-10-17 13:05
+
+import students.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('students', '0015_monthlyledger'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='feepayment',
+            name='screenshot',
+            field=models.ImageField(blank=True, null=True, storage=students.storage.ContentAddressedStorage(), upload_to='fees_screenshots/'),
+        ),
+        migrations.AlterField(
+            model_name='salarypayment',
+            name='salary_slip',
+            field=models.FileField(blank=True, null=True, storage=students.storage.ContentAddressedStorage(), upload_to='salary_slips/'),
+        ),
+    ]
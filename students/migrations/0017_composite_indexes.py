@@ -0,0 +1,37 @@
+# Generated by Django 6.0.2 on 2026-10-17 14:10
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction; the
+    # tables stay writable while the indexes are built
+    atomic = False
+
+    dependencies = [
+        ('students', '0016_content_addressed_files'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='expense',
+            index=models.Index(fields=['expense_date', 'category'], name='expense_date_category_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='feepayment',
+            index=models.Index(fields=['status', '-date_paid'], name='fee_payment_status_date_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='student',
+            index=models.Index(fields=['grade', 'is_active'], name='student_grade_active_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='student',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['-created_at'], name='student_active_recent_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='studentattendance',
+            index=models.Index(fields=['date', 'status'], name='student_attendance_day_idx'),
+        ),
+    ]
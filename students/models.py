@@ -1,11 +1,19 @@
-from django.db import models
+import re
+
+from django.db import IntegrityError, models, transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, TruncMonth, Upper
+from django.contrib.postgres.indexes import GinIndex, OpClass
 from django.contrib.auth.models import AbstractBaseUser
 from django.utils import timezone
+from django.utils.dateparse import parse_date
 
-from django.db.models.signals import post_delete, post_save
-from django.dispatch import receiver
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import Signal, receiver
 
 from .manager import MyUserManager
+from .cache import bump_cache_version
+from .storage import content_storage
 
 
 class CustomUser(AbstractBaseUser):
@@ -40,6 +48,18 @@ class CustomUser(AbstractBaseUser):
         return self.is_admin
 
 
+def normalize_digits(value):
+    """Strip dashes, spaces and any other non-digit from a CNIC/phone."""
+    return re.sub(r'\D', '', value or '')
+
+
+def billing_month_of(value):
+    """First day of the month of `value` (a date or ISO string), or None."""
+    if isinstance(value, str):
+        value = parse_date(value)
+    return value.replace(day=1) if value else None
+
+
 class Guardian(models.Model):
     name = models.CharField(max_length=100, null=True, blank=True)
     cnic = models.CharField(
@@ -47,10 +67,42 @@ class Guardian(models.Model):
         help_text="National ID number"
     )
     phone_number = models.CharField(max_length=15, unique=True)
+    # Digits-only copies of cnic/phone_number used by search
+    cnic_digits = models.CharField(max_length=15, blank=True, default='')
+    phone_digits = models.CharField(max_length=15, blank=True, default='')
     address = models.TextField(blank=True, null=True)
     last_message_send = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            GinIndex(
+                OpClass(Upper('name'), name='gin_trgm_ops'),
+                name='guardian_name_trgm',
+            ),
+            GinIndex(
+                fields=['cnic_digits'], opclasses=['gin_trgm_ops'],
+                name='guardian_cnic_digits_trgm',
+            ),
+            GinIndex(
+                fields=['phone_digits'], opclasses=['gin_trgm_ops'],
+                name='guardian_phone_digits_trgm',
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.cnic_digits = normalize_digits(self.cnic)
+        self.phone_digits = normalize_digits(self.phone_number)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            update_fields = set(update_fields)
+            if 'cnic' in update_fields:
+                update_fields.add('cnic_digits')
+            if 'phone_number' in update_fields:
+                update_fields.add('phone_digits')
+            kwargs['update_fields'] = update_fields
+        super().save(*args, **kwargs)
+
 
 class Student(models.Model):
     CLASS_CHOICES = [
@@ -75,6 +127,15 @@ class Student(models.Model):
         upload_to='students_images/',
         blank=True, null=True
     )
+    # WebP variants of student_image, see images.render_thumbnails()
+    student_image_64 = models.ImageField(
+        upload_to='students_images/thumbnails/',
+        blank=True, null=True
+    )
+    student_image_256 = models.ImageField(
+        upload_to='students_images/thumbnails/',
+        blank=True, null=True
+    )
     age = models.IntegerField(null=True, blank=True)
     grade = models.CharField(
         max_length=10,
@@ -97,9 +158,34 @@ class Student(models.Model):
     overall_attendance = models.FloatField(
         null=True, blank=True, default=0.0
     )
+    # Copied from the most recent FeePayment, see sync_latest_fee()
+    latest_fee_status = models.CharField(
+        max_length=10, null=True, blank=True, db_index=True
+    )
+    latest_fee_amount = models.DecimalField(
+        max_digits=8, decimal_places=2, null=True, blank=True
+    )
+    latest_fee_date = models.DateField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            GinIndex(
+                OpClass(Upper('name'), name='gin_trgm_ops'),
+                name='student_name_trgm',
+            ),
+            models.Index(
+                fields=['grade', 'is_active'],
+                name='student_grade_active_idx',
+            ),
+            # Most recent active students, for the dashboard
+            models.Index(
+                fields=['-created_at'], condition=Q(is_active=True),
+                name='student_active_recent_idx',
+            ),
+        ]
+
 
 class FeePayment(models.Model):
     STATUS_CHOICES = [
@@ -119,13 +205,52 @@ class FeePayment(models.Model):
     )
     date_paid = models.DateField(auto_now_add=True)
     screenshot = models.ImageField(
-        upload_to='fees_screenshots/',
+        upload_to='fees_screenshots/', storage=content_storage,
         blank=True, null=True
     )
     status = models.CharField(
         max_length=10, choices=STATUS_CHOICES,
         null=True, blank=True
     )
+    # month_paid_for moved to the first of its month, one row per
+    # student and month. Kept in sync by save(); set it yourself when
+    # using bulk_create() or update().
+    billing_month = models.DateField(null=True, blank=True, editable=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['student', 'billing_month'],
+                name='unique_fee_payment_per_month',
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['billing_month'], name='fee_payment_month_idx'
+            ),
+            # The payment list, filtered by status and newest first
+            models.Index(
+                fields=['status', '-date_paid'],
+                name='fee_payment_status_date_idx',
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        billing_month = billing_month_of(self.month_paid_for)
+        if (
+            self.pk and self.billing_month is None and billing_month
+            and FeePayment.objects.filter(
+                student_id=self.student_id, billing_month=billing_month
+            ).exclude(pk=self.pk).exists()
+        ):
+            # An older duplicate that migration 0013 left without a
+            # billing month; the month belongs to the newer payment
+            billing_month = None
+        self.billing_month = billing_month
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'month_paid_for' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'billing_month'}
+        super().save(*args, **kwargs)
 
 
 class Teacher(models.Model):
@@ -150,7 +275,8 @@ class SalaryPayment(models.Model):
     )
     month = models.DateField(null=True, blank=True)
     salary_slip = models.FileField(
-        upload_to='salary_slips/', blank=True, null=True
+        upload_to='salary_slips/', storage=content_storage,
+        blank=True, null=True
     )
     paid_on = models.DateField(auto_now_add=True)
 
@@ -189,6 +315,14 @@ class Expense(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['expense_date', 'category'],
+                name='expense_date_category_idx',
+            ),
+        ]
+
 
 class StudentTestRecords(models.Model):
     student = models.ForeignKey(
@@ -282,6 +416,12 @@ class StudentAttendance(models.Model):
 
     class Meta:
         unique_together = ('student', 'date')
+        indexes = [
+            # Every student's attendance on a day, by status
+            models.Index(
+                fields=['date', 'status'], name='student_attendance_day_idx'
+            ),
+        ]
 
 
 class TeacherAttendance(models.Model):
@@ -304,6 +444,80 @@ class TeacherAttendance(models.Model):
         unique_together = ('teacher', 'date')
 
 
+class ImportStatus(models.TextChoices):
+    PENDING = 'pending', 'Pending'
+    RUNNING = 'running', 'Running'
+    COMPLETED = 'completed', 'Completed'
+    FAILED = 'failed', 'Failed'
+
+
+class StudentImportJob(models.Model):
+    file = models.FileField(upload_to='imports/')
+    status = models.CharField(
+        max_length=10,
+        choices=ImportStatus.choices,
+        default=ImportStatus.PENDING
+    )
+    rows_done = models.PositiveIntegerField(default=0)
+    rows_failed = models.PositiveIntegerField(default=0)
+    # First few rejected rows as {'line', 'error'}, see imports.py
+    errors = models.JSONField(default=list, blank=True)
+    message = models.TextField(blank=True, default='')
+    created_by = models.ForeignKey(
+        CustomUser, related_name='import_jobs',
+        on_delete=models.SET_NULL,
+        null=True, blank=True
+    )
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+
+class FeeSchedule(models.Model):
+    """Monthly fee charged to every active student of a grade."""
+    grade = models.CharField(
+        max_length=10, choices=Student.CLASS_CHOICES, unique=True
+    )
+    amount = models.DecimalField(max_digits=8, decimal_places=2)
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.get_grade_display()}: {self.amount}"
+
+
+class LedgerSource(models.TextChoices):
+    FEE = 'fee', 'Fee payment'
+    EXPENSE = 'expense', 'Expense'
+
+
+class MonthlyLedger(models.Model):
+    """
+    Running totals of FeePayment and Expense amounts per month, source,
+    category and status, kept up to date by the receivers below and
+    rebuilt by reconcile_ledger(). Fees count towards the month they
+    are billed for, expenses towards the month of their expense_date.
+    Missing categories and statuses are stored as ''.
+    """
+    month = models.DateField()
+    source = models.CharField(max_length=10, choices=LedgerSource.choices)
+    category = models.CharField(max_length=20, blank=True, default='')
+    status = models.CharField(max_length=10, blank=True, default='')
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    entries = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['month', 'source', 'category', 'status'],
+                name='unique_monthly_ledger_row',
+            ),
+        ]
+
+
 def recalc_overall_attendance(student):
     total = student.attendance.count()
     if total > 0:
@@ -324,3 +538,229 @@ def update_student_attendance(sender, instance, **kwargs):
 @receiver(post_delete, sender=StudentAttendance)
 def update_student_attendance_on_delete(sender, instance, **kwargs):
     recalc_overall_attendance(instance.student)
+
+
+@receiver(post_save, sender=Student)
+@receiver(post_delete, sender=Student)
+@receiver(post_save, sender=Guardian)
+@receiver(post_delete, sender=Guardian)
+@receiver(post_save, sender=FeePayment)
+@receiver(post_delete, sender=FeePayment)
+@receiver(post_save, sender=Teacher)
+@receiver(post_delete, sender=Teacher)
+@receiver(post_save, sender=SalaryPayment)
+@receiver(post_delete, sender=SalaryPayment)
+@receiver(post_save, sender=Expense)
+@receiver(post_delete, sender=Expense)
+@receiver(post_save, sender=StudentTestRecords)
+@receiver(post_delete, sender=StudentTestRecords)
+@receiver(post_save, sender=Subject)
+@receiver(post_delete, sender=Subject)
+@receiver(post_save, sender=TeacherSubject)
+@receiver(post_delete, sender=TeacherSubject)
+@receiver(post_save, sender=StudentAttendance)
+@receiver(post_delete, sender=StudentAttendance)
+@receiver(post_save, sender=TeacherAttendance)
+@receiver(post_delete, sender=TeacherAttendance)
+def invalidate_cached_data(sender, **kwargs):
+    bump_cache_version(sender)
+
+
+# Sent with `payments` after FeePayments are written without save(),
+# e.g. by bulk_create(), so receivers that act on each new payment do
+# not miss them
+fee_payments_bulk_saved = Signal()
+
+
+def sync_latest_fee(students):
+    """
+    Copy the most recent payment of each student in the `students`
+    queryset onto its latest_fee_* columns, in a single UPDATE.
+    """
+    latest = FeePayment.objects.filter(
+        student=OuterRef('pk')
+    ).order_by('-date_paid', '-id')
+    return students.update(
+        latest_fee_status=Subquery(latest.values('status')[:1]),
+        latest_fee_amount=Subquery(latest.values('amount')[:1]),
+        latest_fee_date=Subquery(latest.values('date_paid')[:1]),
+    )
+
+
+@receiver(post_save, sender=FeePayment)
+@receiver(post_delete, sender=FeePayment)
+def update_student_latest_fee(sender, instance, **kwargs):
+    if instance.student_id:
+        sync_latest_fee(Student.objects.filter(pk=instance.student_id))
+
+
+LEDGER_FIELDS = {
+    FeePayment: ['amount', 'status', 'month_paid_for', 'date_paid'],
+    Expense: ['amount', 'status', 'category', 'expense_date'],
+}
+
+
+def ledger_entry(model, values):
+    """
+    The MonthlyLedger key and amount of one FeePayment or Expense,
+    given its LEDGER_FIELDS as a dict, or None when it has no month.
+    """
+    if model is FeePayment:
+        month = billing_month_of(
+            values['month_paid_for'] or values['date_paid']
+        )
+        key = {'source': LedgerSource.FEE, 'category': ''}
+    else:
+        month = billing_month_of(values['expense_date'])
+        key = {
+            'source': LedgerSource.EXPENSE,
+            'category': values['category'] or '',
+        }
+    if month is None:
+        return None
+    key.update(month=month, status=values['status'] or '')
+    return key, values['amount'] or 0
+
+
+def apply_ledger_delta(key, amount, entries):
+    """Add `amount` and `entries` to the MonthlyLedger row at `key`."""
+    if not amount and not entries:
+        return
+    rows = MonthlyLedger.objects.filter(**key)
+    changes = {
+        'total': F('total') + amount, 'entries': F('entries') + entries
+    }
+    if rows.update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            MonthlyLedger.objects.create(
+                total=amount, entries=entries, **key
+            )
+    except IntegrityError:
+        # Created by a concurrent write in the meantime
+        rows.update(**changes)
+
+
+def move_ledger_entry(previous, current):
+    """
+    Move one row's share of the ledger from `previous` to `current`,
+    both ledger_entry() results or None (no row, or no month).
+    """
+    if previous and current and previous[0] == current[0]:
+        apply_ledger_delta(current[0], current[1] - previous[1], 0)
+        return
+    if previous:
+        apply_ledger_delta(previous[0], -previous[1], -1)
+    if current:
+        apply_ledger_delta(current[0], current[1], 1)
+
+
+def record_ledger_entries(model, instances):
+    """
+    Add rows of `model` written without signals, e.g. by bulk_create(),
+    to the ledger with one update per ledger row.
+    """
+    deltas = {}
+    for instance in instances:
+        entry = ledger_entry(model, {
+            field: getattr(instance, field) for field in LEDGER_FIELDS[model]
+        })
+        if entry is None:
+            continue
+        key, amount = entry
+        frozen = tuple(sorted(key.items()))
+        total, count = deltas.get(frozen, (0, 0))
+        deltas[frozen] = (total + amount, count + 1)
+    for frozen, (amount, count) in deltas.items():
+        apply_ledger_delta(dict(frozen), amount, count)
+
+
+@receiver(pre_save, sender=FeePayment)
+@receiver(pre_save, sender=Expense)
+def remember_ledger_entry(sender, instance, raw=False, **kwargs):
+    """Keep the stored values of a row about to be updated."""
+    instance._ledger_previous = None
+    if instance.pk and not raw:
+        values = sender.objects.filter(pk=instance.pk).values(
+            *LEDGER_FIELDS[sender]
+        ).first()
+        if values:
+            instance._ledger_previous = ledger_entry(sender, values)
+
+
+@receiver(post_save, sender=FeePayment)
+@receiver(post_save, sender=Expense)
+def update_ledger(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_ledger_previous', None)
+    instance._ledger_previous = None
+    move_ledger_entry(previous, ledger_entry(sender, {
+        field: getattr(instance, field) for field in LEDGER_FIELDS[sender]
+    }))
+
+
+@receiver(post_delete, sender=FeePayment)
+@receiver(post_delete, sender=Expense)
+def remove_from_ledger(sender, instance, **kwargs):
+    entry = ledger_entry(sender, {
+        field: getattr(instance, field) for field in LEDGER_FIELDS[sender]
+    })
+    if entry:
+        apply_ledger_delta(entry[0], -entry[1], -1)
+
+
+def reconcile_ledger():
+    """
+    Rebuild MonthlyLedger from FeePayment and Expense. The old rows are
+    deleted first, in the same transaction, so a concurrent write
+    either waits and is counted by the rebuild, or applies its delta to
+    the rebuilt rows. Returns the number of ledger rows.
+    """
+    fee_month = Coalesce(
+        TruncMonth('month_paid_for'), TruncMonth('date_paid'),
+        output_field=models.DateField()
+    )
+    fee_rows = FeePayment.objects.annotate(
+        ledger_month=fee_month,
+        ledger_category=Value(''),
+        ledger_status=Coalesce('status', Value('')),
+    )
+    expense_rows = Expense.objects.filter(
+        expense_date__isnull=False
+    ).annotate(
+        ledger_month=TruncMonth('expense_date'),
+        ledger_category=Coalesce('category', Value('')),
+        ledger_status=Coalesce('status', Value('')),
+    )
+
+    with transaction.atomic():
+        MonthlyLedger.objects.all().delete()
+        rows = []
+        for source, queryset in (
+            (LedgerSource.FEE, fee_rows),
+            (LedgerSource.EXPENSE, expense_rows),
+        ):
+            totals = queryset.values(
+                'ledger_month', 'ledger_category', 'ledger_status'
+            ).annotate(
+                ledger_total=Coalesce(
+                    Sum('amount'), Value(0),
+                    output_field=models.DecimalField()
+                ),
+                ledger_entries=Count('id'),
+            ).order_by()
+            rows.extend(
+                MonthlyLedger(
+                    month=row['ledger_month'],
+                    source=source,
+                    category=row['ledger_category'],
+                    status=row['ledger_status'],
+                    total=row['ledger_total'],
+                    entries=row['ledger_entries'],
+                )
+                for row in totals
+            )
+        MonthlyLedger.objects.bulk_create(rows)
+    return len(rows)
@@ -0,0 +1,214 @@
+import base64
+import datetime
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class CursorJSONEncoder(DjangoJSONEncoder):
+    """
+    DjangoJSONEncoder keeps only milliseconds of datetimes and times; a
+    cursor needs the exact value, or the seek repeats or skips rows
+    within the lost microseconds.
+    """
+    def default(self, o):
+        if isinstance(o, (datetime.datetime, datetime.time)):
+            return o.isoformat()
+        return super().default(o)
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination that seeks past the last row of the previous page
+    instead of using OFFSET, so every page costs the same as the first.
+
+    The cursor carries the values of the whole ordering tuple for the
+    boundary row. The primary key is always appended to the ordering
+    so the tuple is unique. NULLs sort the way Postgres sorts them:
+    last in ascending order and first in descending order.
+    """
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def __init__(self, ordering):
+        ordering = list(ordering)
+        if not any(field.lstrip('-') in ('id', 'pk') for field in ordering):
+            descending = ordering and ordering[0].startswith('-')
+            ordering.append('-id' if descending else 'id')
+        self.ordering = ordering
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+
+        values, self.reverse = self.decode_cursor(request, queryset)
+        self.has_cursor = values is not None
+
+        ordering = self.ordering
+        if self.reverse:
+            ordering = [self._flip(field) for field in ordering]
+
+        # The count is only run when asked for, and covers the whole
+        # filtered result rather than what is left after the cursor.
+        self.count = None
+        if request.query_params.get(self.count_query_param) == 'true':
+            self.count = queryset.order_by().count()
+
+        queryset = queryset.order_by(*ordering)
+        if self.has_cursor:
+            queryset = queryset.filter(self._seek(ordering, values))
+
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if self.reverse:
+            rows.reverse()
+
+        if self.reverse:
+            self.has_next = self.has_cursor
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = self.has_cursor
+
+        self.first_row = rows[0] if rows else None
+        self.last_row = rows[-1] if rows else None
+        return rows
+
+    def get_paginated_response(self, data):
+        payload = OrderedDict()
+        if self.count is not None:
+            payload['count'] = self.count
+        payload['next'] = self.get_next_link()
+        payload['previous'] = self.get_previous_link()
+        payload['results'] = data
+        return Response(payload)
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def get_next_link(self):
+        if not self.has_next or self.last_row is None:
+            return None
+        return self._link(self.last_row, reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or self.first_row is None:
+            return None
+        return self._link(self.first_row, reverse=True)
+
+    def decode_cursor(self, request, queryset):
+        """
+        The boundary values and direction of the cursor in the request,
+        each value converted by the field it is ordered on.
+        """
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            decoded = base64.urlsafe_b64decode(encoded.encode('ascii'))
+            cursor = json.loads(decoded)
+            values = cursor['v']
+            reverse = bool(cursor.get('r'))
+            if not isinstance(values, list) or (
+                len(values) != len(self.ordering)
+            ):
+                raise ValueError('Wrong number of values')
+            values = [
+                self._field(queryset, field).to_python(value)
+                for field, value in zip(self.ordering, values)
+            ]
+        except (
+            TypeError, ValueError, KeyError, UnicodeEncodeError,
+            ValidationError,
+        ):
+            raise NotFound(self.invalid_cursor_message)
+        return values, reverse
+
+    def encode_cursor(self, values, reverse):
+        cursor = {'v': values}
+        if reverse:
+            cursor['r'] = 1
+        data = json.dumps(cursor, cls=CursorJSONEncoder)
+        return base64.urlsafe_b64encode(data.encode('utf-8')).decode('ascii')
+
+    def _link(self, row, reverse):
+        values = [
+            getattr(row, field.lstrip('-')) for field in self.ordering
+        ]
+        url = remove_query_param(self.base_url, self.count_query_param)
+        return replace_query_param(
+            url, self.cursor_query_param,
+            self.encode_cursor(values, reverse)
+        )
+
+    @staticmethod
+    def _field(queryset, field):
+        """The model field or annotation that `field` orders on."""
+        name = field.lstrip('-')
+        if name in queryset.query.annotations:
+            return queryset.query.annotations[name].output_field
+        if name == 'pk':
+            return queryset.model._meta.pk
+        return queryset.model._meta.get_field(name)
+
+    @staticmethod
+    def _flip(field):
+        return field[1:] if field.startswith('-') else f'-{field}'
+
+    @staticmethod
+    def _after(field, value):
+        """Rows that sort strictly after `value` on a single field."""
+        name = field.lstrip('-')
+        if field.startswith('-'):
+            # Descending, NULLs first
+            if value is None:
+                return Q(**{f'{name}__isnull': False})
+            return Q(**{f'{name}__lt': value})
+        # Ascending, NULLs last
+        if value is None:
+            return Q(pk__in=[])
+        return Q(**{f'{name}__gt': value}) | Q(**{f'{name}__isnull': True})
+
+    @staticmethod
+    def _equal(field, value):
+        name = field.lstrip('-')
+        if value is None:
+            return Q(**{f'{name}__isnull': True})
+        return Q(**{name: value})
+
+    def _seek(self, ordering, values):
+        condition = Q(pk__in=[])
+        prefix = Q()
+        for field, value in zip(ordering, values):
+            condition |= prefix & self._after(field, value)
+            prefix &= self._equal(field, value)
+        return condition
+
+
+def get_list_paginator(request, ordering, default_class):
+    """
+    Pick the paginator for a list endpoint: keyset pagination when the
+    client asks for `?pagination=cursor`, otherwise `default_class`.
+    """
+    if request.query_params.get('pagination') == 'cursor':
+        return KeysetPagination(ordering)
+    return default_class()
@@ -0,0 +1,78 @@
+import re
+
+from django.contrib.postgres.search import TrigramWordSimilarity
+from django.db.models import FloatField, Q
+from django.db.models.functions import Cast, Greatest
+
+from .models import Guardian, Student, normalize_digits
+
+
+# A term made only of digits and separators is treated as a CNIC or
+# phone number and matched against the digits-only columns.
+NUMBER_TERM = re.compile(r'[\d\s+-]+')
+
+
+def guardian_search_filter(term):
+    """
+    Guardians whose name, CNIC or phone number contains `term`. Every
+    branch is served by a pg_trgm GIN index, so Postgres can combine
+    them with a BitmapOr instead of scanning the table.
+    """
+    condition = Q(name__icontains=term)
+    if NUMBER_TERM.fullmatch(term):
+        digits = normalize_digits(term)
+        if digits:
+            condition |= (
+                Q(cnic_digits__contains=digits) |
+                Q(phone_digits__contains=digits)
+            )
+    return condition
+
+
+def search_guardians(queryset, term):
+    return queryset.filter(guardian_search_filter(term))
+
+
+def rank_guardians(queryset, term):
+    """Annotate `search_rank`, the trigram word similarity to the name."""
+    return queryset.annotate(
+        search_rank=TrigramWordSimilarity(term, 'name')
+    )
+
+
+def search_students(queryset, term):
+    """
+    Students whose name, or whose guardian's name, CNIC or phone number,
+    contains `term`.
+
+    Each side is matched on its own table and the ids are combined with
+    UNION. An OR across the guardian join would force a sequential scan.
+    """
+    guardians = Guardian.objects.filter(
+        guardian_search_filter(term)
+    ).values('pk')
+    matching_ids = Student.objects.filter(
+        name__icontains=term
+    ).values('pk').union(
+        Student.objects.filter(guardian__in=guardians).values('pk')
+    )
+    return queryset.filter(pk__in=matching_ids)
+
+
+def rank_students(queryset, term):
+    """
+    Annotate `search_rank`, the best trigram word similarity of `term`
+    against the student's and the guardian's name.
+
+    The similarity is a float4; it is cast to float8 so the value a
+    keyset cursor carries back compares equal to the one in the row.
+    """
+    return queryset.annotate(
+        search_rank=Cast(
+            Greatest(
+                TrigramWordSimilarity(term, 'name'),
+                TrigramWordSimilarity(term, 'guardian__name'),
+            ),
+            FloatField(),
+        )
+    )
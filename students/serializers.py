@@ -1,29 +1,96 @@
-import base64
-import uuid
-
 from django.db import transaction, models
-from django.core.files.base import ContentFile
 from rest_framework import serializers
 
+from .guardians import upsert_guardians
+from .images import (
+    InvalidImage, is_new_image, schedule_image_processing, stage_image
+)
 from .models import (
     Student, Guardian, FeePayment, Expense, StudentTestRecords,
     StudentAttendance, AttendanceStatus,
-    Teacher, SalaryPayment, Subject, TeacherSubject
+    Teacher, SalaryPayment, Subject, TeacherSubject, StudentImportJob
 )
 
 
+def get_sparse_fieldsets(request):
+    """
+    Read `?fields=` and `?expand=` (comma separated) into the keyword
+    arguments taken by SparseFieldsetsMixin serializers.
+    """
+    def split(param):
+        value = request.query_params.get(param)
+        if not value:
+            return None
+        return [name.strip() for name in value.split(',') if name.strip()]
+
+    return {'fields': split('fields'), 'expand': split('expand')}
+
+
+class SparseFieldsetsMixin:
+    """
+    Serializer mixin for `?fields=` and `?expand=`.
+
+    `fields` limits the output to the named fields. Fields listed in
+    `Meta.expandable_fields` are left out unless named in `expand`.
+    Dropped fields are removed from the serializer, so their method
+    fields and nested serializers never run.
+
+    `optimize_queryset` applies only the joins the remaining fields
+    need, as declared in `Meta.select_related_fields` and
+    `Meta.prefetch_related_fields` (field name -> lookups).
+    """
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        expand = kwargs.pop('expand', None)
+        super().__init__(*args, **kwargs)
+        for name in list(self.fields):
+            if not self.is_requested(name, fields, expand):
+                self.fields.pop(name)
+
+    @classmethod
+    def is_requested(cls, name, fields=None, expand=None):
+        expand = expand or ()
+        if name in getattr(cls.Meta, 'expandable_fields', ()):
+            return name in expand
+        return not fields or name in fields
+
+    @classmethod
+    def optimize_queryset(cls, queryset, fields=None, expand=None):
+        def lookups(option):
+            mapping = getattr(cls.Meta, option, {})
+            return sorted({
+                lookup
+                for name, related in mapping.items()
+                if cls.is_requested(name, fields, expand)
+                for lookup in related
+            })
+
+        select = lookups('select_related_fields')
+        if select:
+            queryset = queryset.select_related(*select)
+        prefetch = lookups('prefetch_related_fields')
+        if prefetch:
+            queryset = queryset.prefetch_related(*prefetch)
+        return queryset
+
+
+class StagedImage(str):
+    """Name of a new image written to the staging area."""
+
+
 class Base64ImageField(serializers.ImageField):
+    """
+    Accepts a base64 data URL as well as a multipart upload. Both are
+    only staged here; the owner saving the serializer schedules
+    process_student_image once its row is committed.
+    """
     def to_internal_value(self, data):
-        if isinstance(data, str) and data.startswith('data:image'):
+        if is_new_image(data):
             try:
-                format, imgstr = data.split(';base64,')
-                ext = format.split('/')[-1]
-                data = ContentFile(
-                    base64.b64decode(imgstr),
-                    name=f"student_{uuid.uuid4()}.{ext}"
-                )
-            except Exception:
-                raise serializers.ValidationError("Invalid base64 image")
+                return StagedImage(stage_image(data))
+            except InvalidImage as e:
+                raise serializers.ValidationError(str(e))
 
         return super().to_internal_value(data)
 
@@ -44,7 +111,23 @@ class CreateGuardianSerializer(serializers.ModelSerializer):
         }
 
 
-class GuardianDetailSerializer(serializers.ModelSerializer):
+class GuardianListSerializer(CreateGuardianSerializer):
+    """Guardian row with the totals annotated by ListGuardianAPIView."""
+    student_count = serializers.IntegerField(read_only=True)
+    active_student_count = serializers.IntegerField(read_only=True)
+    pending_fee_total = serializers.DecimalField(
+        max_digits=12, decimal_places=2, read_only=True
+    )
+
+    class Meta(CreateGuardianSerializer.Meta):
+        fields = CreateGuardianSerializer.Meta.fields + [
+            'student_count', 'active_student_count', 'pending_fee_total'
+        ]
+
+
+class GuardianDetailSerializer(
+    SparseFieldsetsMixin, serializers.ModelSerializer
+):
     students = ReadStudentSerializer(many=True, read_only=True)
 
     class Meta:
@@ -53,6 +136,8 @@ class GuardianDetailSerializer(serializers.ModelSerializer):
             'id', 'name', 'cnic', 'phone_number',
             'address', 'students'
         ]
+        expandable_fields = ['students']
+        prefetch_related_fields = {'students': ['students']}
 
 
 class CreateFeePayment(serializers.ModelSerializer):
@@ -73,21 +158,25 @@ class CreateStudentSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         guardian_data = validated_data.pop('guardian', {})
         fee_data = validated_data.pop('payments', {})
+        staged_image = None
+        if isinstance(validated_data.get('student_image'), StagedImage):
+            staged_image = validated_data.pop('student_image')
 
         with transaction.atomic():
-            guardian, created = Guardian.objects.get_or_create(
-                cnic=guardian_data.get('cnic'),
-                defaults={
-                    'name': guardian_data.get('name'),
-                    'phone_number': guardian_data.get('phone_number'),
-                    'address': guardian_data.get('address')
-                }
-            )
+            # An existing guardian (same CNIC) is used as it is
+            guardians, errors = upsert_guardians([guardian_data])
+            if errors:
+                raise serializers.ValidationError(
+                    {'guardian': [errors[0]['error']]}
+                )
+            guardian = guardians[guardian_data.get('cnic')]
             student = Student.objects.create(
                 guardian=guardian, **validated_data
             )
             if fee_data:
                 FeePayment.objects.create(student=student, **fee_data)
+            if staged_image:
+                schedule_image_processing(student.id, staged_image)
             return student
 
 
@@ -104,7 +193,9 @@ class CustomStudentSerializer(serializers.ModelSerializer):
         return representation
 
 
-class StudentListSerializer(serializers.ModelSerializer):
+class StudentListSerializer(
+    SparseFieldsetsMixin, serializers.ModelSerializer
+):
     guardian_name = serializers.CharField(
         source='guardian.name', read_only=True
     )
@@ -119,16 +210,19 @@ class StudentListSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'name', 'age', 'grade', 'guardian_name',
             'guardian_phone', 'is_active', 'latest_fee_status',
-            'fees_amount', 'student_image'
+            'fees_amount', 'student_image', 'student_image_64',
+            'student_image_256'
         ]
+        select_related_fields = {
+            'guardian_name': ['guardian'],
+            'guardian_phone': ['guardian'],
+        }
 
     def get_latest_fee_status(self, obj):
-        latest_payment = obj.payments.order_by('-date_paid').first()
-        return latest_payment.status if latest_payment else 'no_payment'
+        return obj.latest_fee_status or 'no_payment'
 
     def get_fees_amount(self, obj):
-        latest_payments = obj.payments.order_by('-date_paid').first()
-        return latest_payments.amount if latest_payments else 0
+        return obj.latest_fee_amount or 0
 
 
 class FeePaymentSerializer(serializers.ModelSerializer):
@@ -192,22 +286,29 @@ class StudentDetailSerializer(serializers.ModelSerializer):
         ]
 
     def get_latest_fee_status(self, obj):
-        latest_payment = obj.payments.order_by('-date_paid').first()
-        return latest_payment.status if latest_payment else 'no_payment'
+        return obj.latest_fee_status or 'no_payment'
 
+    # The totals are annotated by StudentDetailAPIView; the queries
+    # below only run for a student loaded without them.
     def get_total_fees_paid(self, obj):
+        if hasattr(obj, 'total_fees_paid'):
+            return obj.total_fees_paid or 0
         paid_fees = obj.payments.filter(
             status='paid'
         ).aggregate(total=models.Sum('amount'))
         return paid_fees['total'] or 0
 
     def get_total_fees_pending(self, obj):
+        if hasattr(obj, 'total_fees_pending'):
+            return obj.total_fees_pending or 0
         pending_fees = obj.payments.filter(
             status='pending'
         ).aggregate(total=models.Sum('amount'))
         return pending_fees['total'] or 0
 
     def get_payment_count(self, obj):
+        if hasattr(obj, 'payment_count'):
+            return obj.payment_count
         return obj.payments.count()
 
 
@@ -230,12 +331,12 @@ class DashboardStatsSerializer(serializers.ModelSerializer):
         model = Student
         fields = [
             'id', 'name', 'grade', 'date_joined',
-            "fee_status", "guardian_name", "student_image"
+            "fee_status", "guardian_name", "student_image",
+            "student_image_64", "student_image_256"
         ]
 
     def get_fee_status(self, obj):
-        latest_payment = obj.payments.order_by('-date_paid').first()
-        return latest_payment.status if latest_payment else 'no_payment'
+        return obj.latest_fee_status or 'no_payment'
 
 
 class ReadExpenseSerializer(serializers.ModelSerializer):
@@ -329,7 +430,9 @@ class CreateSalaryPaymentSerializer(serializers.ModelSerializer):
         fields = ['amount', 'month', 'salary_slip']
 
 
-class TeacherListSerializer(serializers.ModelSerializer):
+class TeacherListSerializer(
+    SparseFieldsetsMixin, serializers.ModelSerializer
+):
     subjects = serializers.SerializerMethodField()
     latest_salary_status = serializers.SerializerMethodField()
     total_salary_paid = serializers.SerializerMethodField()
@@ -341,16 +444,25 @@ class TeacherListSerializer(serializers.ModelSerializer):
             'date_joined', 'subjects',
             'latest_salary_status', 'total_salary_paid'
         ]
+        prefetch_related_fields = {
+            'subjects': ['teacher_subjects__subject'],
+            'latest_salary_status': ['salary_payments'],
+            'total_salary_paid': ['salary_payments'],
+        }
 
+    # The methods below read the prefetched relations instead of
+    # issuing a query per teacher.
     def get_subjects(self, obj):
-        ts = obj.teacher_subjects.select_related('subject').all()
         return [
             {'id': t.subject.id, 'name': t.subject.name}
-            for t in ts if t.subject
+            for t in obj.teacher_subjects.all() if t.subject
         ]
 
     def get_latest_salary_status(self, obj):
-        latest = obj.salary_payments.order_by('-paid_on').first()
+        latest = max(
+            obj.salary_payments.all(),
+            key=lambda payment: payment.paid_on, default=None
+        )
         if not latest:
             return 'no_payment'
         from django.utils import timezone
@@ -363,10 +475,9 @@ class TeacherListSerializer(serializers.ModelSerializer):
         return 'pending'
 
     def get_total_salary_paid(self, obj):
-        result = obj.salary_payments.aggregate(
-            total=models.Sum('amount')
+        return sum(
+            payment.amount or 0 for payment in obj.salary_payments.all()
         )
-        return result['total'] or 0
 
 
 class TeacherDetailSerializer(serializers.ModelSerializer):
@@ -448,3 +559,12 @@ class CreateTeacherSerializer(serializers.ModelSerializer):
                         teacher=instance, subject=sub
                     )
         return instance
+
+
+class StudentImportJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = StudentImportJob
+        fields = [
+            'id', 'status', 'rows_done', 'rows_failed', 'errors',
+            'message', 'created_at', 'started_at', 'finished_at'
+        ]
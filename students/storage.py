@@ -0,0 +1,64 @@
+import hashlib
+import os
+import re
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+HASH_CHUNK_SIZE = 64 * 1024
+DIGEST_NAME_RE = re.compile(r'(^|/)[0-9a-f]{2}/[0-9a-f]{64}(\.\w+)?$')
+
+
+def file_digest(content):
+    """sha256 hex digest of a Django File, read chunk by chunk."""
+    digest = hashlib.sha256()
+    for chunk in content.chunks(HASH_CHUNK_SIZE):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def is_digest_name(name):
+    """True for names already in the ContentAddressedStorage layout."""
+    return bool(name) and DIGEST_NAME_RE.search(name) is not None
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    FileSystemStorage that stores each file once, under the sha256
+    digest of its content: `<upload_to>/<ab>/<digest><ext>`. Saving
+    bytes that are already stored writes nothing and returns the name
+    of the existing blob, so every record that got the same upload
+    refers to the same file.
+
+    A blob can be shared by several records, so it must not be deleted
+    on behalf of one of them.
+    """
+
+    def digest_name(self, name, content):
+        directory, filename = os.path.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        digest = file_digest(content)
+        return '/'.join(
+            part for part in (directory, digest[:2], digest + extension)
+            if part
+        )
+
+    def save(self, name, content, max_length=None):
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.digest_name(name, content)
+        if self.exists(name):
+            return name
+        # Write under a temporary name and rename it into place, so a
+        # blob is never seen half written. When two requests store the
+        # same bytes at once, the second rename replaces the blob with
+        # an identical one.
+        partial = super().save(f'{name}.part', content, max_length)
+        os.replace(self.path(partial), self.path(name))
+        return name
+
+
+content_storage = ContentAddressedStorage()
@@ -5,7 +5,15 @@ import requests
 from django.utils import timezone
 from celery import shared_task
 
-from .models import Guardian
+from django.core.files.storage import default_storage
+
+from .cache import bump_cache_version
+from .fees import create_monthly_fees
+from .images import (
+    InvalidImage, clean_staged_image, render_thumbnails, save_thumbnails
+)
+from .imports import run_import
+from .models import Guardian, ImportStatus, Student, StudentImportJob
 
 
 @shared_task(bind=True, max_retries=3)
@@ -24,6 +32,7 @@ def send_message(self, phone_number, message, guardian_id):
         Guardian.objects.filter(id=guardian_id).update(
             last_message_send=send_time
         )
+        bump_cache_version(Guardian)
 
         return {
             'status': 'success',
@@ -40,3 +49,78 @@ def send_message(self, phone_number, message, guardian_id):
         if self.request.retries >= self.max_retries:
             print("FINAL FAILURE FOR GUARDIAN ===", guardian_id)
         raise self.retry(exc=e, countdown=60 * (2 ** self.request.retries))
+
+
+@shared_task(bind=True, max_retries=3)
+def process_student_image(self, student_id, staged_name):
+    """
+    Decode, validate and re-encode a staged student photo, render its
+    thumbnails, then point Student.student_image and the thumbnail
+    fields at the results and remove the staged file.
+    """
+    try:
+        student = Student.objects.filter(pk=student_id).first()
+        if student is None:
+            default_storage.delete(staged_name)
+            return {'status': 'skipped', 'student_id': student_id}
+
+        try:
+            image = clean_staged_image(staged_name)
+        except InvalidImage as e:
+            default_storage.delete(staged_name)
+            print("INVALID IMAGE FOR STUDENT ===", student_id, str(e))
+            return {'status': 'error', 'message': str(e)}
+
+        thumbnails = render_thumbnails(image.read())
+        image.seek(0)
+        student.student_image.save(image.name, image, save=False)
+        # update() so a concurrent edit of the student is not overwritten
+        Student.objects.filter(pk=student_id).update(
+            student_image=student.student_image.name,
+            **save_thumbnails(student, thumbnails)
+        )
+        bump_cache_version(Student)
+        default_storage.delete(staged_name)
+
+        return {
+            'status': 'success',
+            'student_id': student_id,
+            'student_image': student.student_image.name
+        }
+    except Exception as e:
+        traceback.print_exc()
+        if self.request.retries >= self.max_retries:
+            print("FINAL FAILURE FOR STUDENT IMAGE ===", student_id)
+            default_storage.delete(staged_name)
+        raise self.retry(exc=e, countdown=60 * (2 ** self.request.retries))
+
+
+@shared_task
+def run_student_import(job_id):
+    """Import the roster CSV of a StudentImportJob, see imports.py."""
+    job = StudentImportJob.objects.filter(pk=job_id).first()
+    if job is None:
+        return {'status': 'skipped', 'job_id': job_id}
+    try:
+        run_import(job)
+    except Exception as e:
+        traceback.print_exc()
+        StudentImportJob.objects.filter(pk=job_id).update(
+            status=ImportStatus.FAILED,
+            message=str(e),
+            finished_at=timezone.now()
+        )
+        return {'status': 'error', 'job_id': job_id, 'message': str(e)}
+    return {'status': 'success', 'job_id': job_id}
+
+
+@shared_task
+def generate_monthly_fees():
+    """Create this month's pending fee payments, see fees.py."""
+    month = timezone.localdate()
+    created = create_monthly_fees(month)
+    return {
+        'status': 'success',
+        'month': month.strftime('%Y-%m'),
+        'created': created
+    }
@@ -1,3 +1,690 @@
-from django.test import TestCase
+import datetime
+import io
+import tempfile
+import threading
+import time
+from unittest import mock
 
-# Create your tests here.
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, connections, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.exceptions import NotFound
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from notification_system.models import Notification
+from PIL import Image
+from .models import (
+    Expense, FeePayment, FeeSchedule, Guardian, MonthlyLedger, Student,
+    StudentAttendance, reconcile_ledger
+)
+from .enrollment import enroll_students
+from .guardians import upsert_guardians
+from .fees import (
+    build_unpaid_index, create_monthly_fees, mark_payments_paid,
+    reconcile_statement, upsert_fee_payment
+)
+from .images import InvalidImage, STAGING_DIR, clean_staged_image
+from .pagination import KeysetPagination
+from .serializers import CreateStudentSerializer
+from .tasks import process_student_image
+
+
+class HotQueryIndexTests(TestCase):
+    """
+    The filter/sort queries of the list endpoints are served by the
+    composite and partial indexes, checked with EXPLAIN. Sequential
+    scans are disabled so the plan does not depend on the table sizes.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        guardian = Guardian.objects.create(
+            cnic='35202-0000000-1', phone_number='0300-0000000'
+        )
+        students = Student.objects.bulk_create([
+            Student(
+                name=f'Student {i}', guardian=guardian,
+                grade=['1', '2', '3'][i % 3], is_active=i % 4 != 0,
+            )
+            for i in range(60)
+        ])
+        today = datetime.date(2026, 10, 1)
+        FeePayment.objects.bulk_create([
+            FeePayment(
+                student=student, amount=5000,
+                month_paid_for=today, billing_month=today,
+                status=['paid', 'pending', 'late'][i % 3],
+            )
+            for i, student in enumerate(students)
+        ])
+        StudentAttendance.objects.bulk_create([
+            StudentAttendance(
+                student=student, date=today - datetime.timedelta(days=day),
+                status=['present', 'absent'][(i + day) % 2],
+            )
+            for i, student in enumerate(students)
+            for day in range(5)
+        ])
+        Expense.objects.bulk_create([
+            Expense(
+                title=f'Expense {i}', amount=100,
+                category=['rent', 'utilities', 'other'][i % 3],
+                expense_date=today - datetime.timedelta(days=i),
+            )
+            for i in range(60)
+        ])
+        Notification.objects.bulk_create([
+            Notification(title=f'Notification {i}', is_read=i % 2 == 0)
+            for i in range(60)
+        ])
+
+    def assertUsesIndex(self, queryset, index_name):
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        plan = queryset.explain()
+        self.assertIn(index_name, plan)
+
+    def test_hot_queries_use_their_index(self):
+        day = datetime.date(2026, 10, 1)
+        queries = {
+            # ListCreatePaymentAPIView, ?status=pending
+            'fee_payment_status_date_idx': FeePayment.objects.filter(
+                status='pending'
+            ).order_by('-date_paid'),
+            # ListCreateStudentAPIView, ?grade=2&is_active=true
+            'student_grade_active_idx': Student.objects.filter(
+                grade='2', is_active=True
+            ),
+            # DashboardStatsAPIView, recent students
+            'student_active_recent_idx': Student.objects.filter(
+                is_active=True
+            ).order_by('-created_at')[:5],
+            # ListCreateExpenseAPIView, a date range of one category
+            'expense_date_category_idx': Expense.objects.filter(
+                expense_date__gte=day - datetime.timedelta(days=30),
+                category='rent',
+            ).order_by('-expense_date'),
+            # Attendance of every student on a day, by status
+            'student_attendance_day_idx': StudentAttendance.objects.filter(
+                date=day, status='absent'
+            ),
+            # ListCreateNotificationAPIView, ?is_read=false
+            'notification_read_created_idx': Notification.objects.filter(
+                is_read=False
+            ).order_by('-created_at', '-id'),
+        }
+        for index_name, queryset in queries.items():
+            with self.subTest(index=index_name):
+                self.assertUsesIndex(queryset, index_name)
+
+
+class KeysetPaginationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        Expense.objects.bulk_create([
+            Expense(title=f'Expense {i}', amount=100) for i in range(5)
+        ])
+        # Every row inside the same millisecond
+        moment = timezone.now().replace(microsecond=123000)
+        for i, expense in enumerate(Expense.objects.order_by('id')):
+            Expense.objects.filter(pk=expense.pk).update(
+                created_at=moment + datetime.timedelta(microseconds=i * 100)
+            )
+
+    def walk(self, ordering):
+        """Ids of every page, following the next links."""
+        factory = APIRequestFactory()
+        url = '/api/expenses/?page_size=2'
+        ids = []
+        # A cursor that repeats rows would page forever
+        for _ in range(10):
+            if not url:
+                break
+            paginator = KeysetPagination(ordering)
+            rows = paginator.paginate_queryset(
+                Expense.objects.all(), Request(factory.get(url))
+            )
+            ids.extend(row.id for row in rows)
+            url = paginator.get_next_link()
+        return ids
+
+    def test_cursor_keeps_microseconds(self):
+        for ordering in ('created_at', '-created_at'):
+            with self.subTest(ordering=ordering):
+                tiebreak = '-id' if ordering.startswith('-') else 'id'
+                expected = list(Expense.objects.order_by(
+                    ordering, tiebreak
+                ).values_list('id', flat=True))
+                self.assertEqual(self.walk([ordering]), expected)
+
+    def test_cursor_with_a_value_of_the_wrong_type(self):
+        factory = APIRequestFactory()
+        paginator = KeysetPagination(['-created_at'])
+        for values in (['abc', 1], [None, 'abc'], 'ab', [1]):
+            with self.subTest(values=values):
+                cursor = paginator.encode_cursor(values, reverse=False)
+                request = Request(
+                    factory.get('/api/expenses/', {'cursor': cursor})
+                )
+                with self.assertRaises(NotFound):
+                    paginator.paginate_queryset(
+                        Expense.objects.all(), request
+                    )
+
+    def test_cursor_keeps_tied_search_ranks(self):
+        # word_similarity('Al', 'Alina') is 2/3, which float4 rounds
+        guardian = Guardian.objects.create(
+            cnic='35202-2222222-2', phone_number='0300-2222222'
+        )
+        expected = sorted((
+            Student.objects.create(name='Alina', guardian=guardian).id
+            for _ in range(5)
+        ), reverse=True)
+        client = APIClient()
+        url = '/api/students/'
+        params = {
+            'search': 'Al', 'search_mode': 'rank', 'pagination': 'cursor',
+            'page_size': 2,
+        }
+        ids = []
+        for _ in range(10):
+            if not url:
+                break
+            response = client.get(url, params)
+            ids.extend(row['id'] for row in response.data['results'])
+            url, params = response.data['next'], None
+        self.assertEqual(ids, expected)
+
+
+class EnrollmentDuplicateTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.guardian = Guardian.objects.create(
+            cnic='35202-1111111-1', phone_number='0300-1111111'
+        )
+        Student.objects.create(
+            name='Ali', guardian=cls.guardian, grade='3', age=13
+        )
+
+    def test_string_age_matches_existing_student(self):
+        # The bulk form sends ages as strings
+        created, errors = enroll_students(self.guardian, [
+            {'name': 'Ali', 'grade': '3', 'age': '13'},
+        ])
+        self.assertEqual(created, [])
+        self.assertEqual(len(errors), 1)
+        self.assertIn('already exists', errors[0]['error'])
+        self.assertEqual(
+            Student.objects.filter(guardian=self.guardian).count(), 1
+        )
+
+    def test_string_and_int_age_repeat_in_request(self):
+        created, errors = enroll_students(self.guardian, [
+            {'name': 'Sara', 'grade': '2', 'age': '9'},
+            {'name': 'Sara', 'grade': '2', 'age': 9},
+        ])
+        self.assertEqual(created, [])
+        self.assertEqual(
+            errors[0]['error'],
+            'Student appears more than once in this request'
+        )
+
+    def test_invalid_age_is_rejected(self):
+        created, errors = enroll_students(self.guardian, [
+            {'name': 'Sara', 'grade': '2', 'age': 'nine'},
+        ])
+        self.assertEqual(created, [])
+        self.assertEqual(errors[0]['index'], 0)
+
+
+class GuardianUpsertTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.guardian = Guardian.objects.create(
+            name='Bilal', cnic='35202-6666666-6',
+            phone_number='0300-6666666', address='Lahore',
+        )
+
+    def test_existing_guardian_is_returned_as_stored(self):
+        serializer = CreateStudentSerializer(data={
+            'name': 'Ali',
+            'guardian': {
+                'name': 'Someone else', 'cnic': self.guardian.cnic,
+                'phone_number': '0300-0000000', 'address': 'Karachi',
+            },
+        })
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        student = serializer.save()
+        self.assertEqual(student.guardian.pk, self.guardian.pk)
+        self.assertEqual(student.guardian.name, 'Bilal')
+        self.assertEqual(student.guardian.phone_number, '0300-6666666')
+        self.assertEqual(serializer.data['guardian']['address'], 'Lahore')
+
+    def test_phone_taken_after_the_check(self):
+        # Another request commits the phone number after the first
+        # phone check ran, so that check does not see it
+        Guardian.objects.create(
+            cnic='35202-9999999-9', phone_number='0300-8888888'
+        )
+        checks = []
+        real_filter = Guardian.objects.filter
+
+        def filter(*args, **kwargs):
+            checks.append(args)
+            if len(checks) == 1:
+                return Guardian.objects.none()
+            return real_filter(*args, **kwargs)
+
+        with mock.patch.object(Guardian.objects, 'filter', filter):
+            guardians, errors = upsert_guardians([
+                {'cnic': '35202-8888888-8', 'phone_number': '0300-8888888'},
+                {'cnic': '35202-1212121-2', 'phone_number': '0300-1212121'},
+            ])
+        self.assertEqual(list(guardians), ['35202-1212121-2'])
+        self.assertEqual(
+            errors, [{
+                'index': 0, 'cnic': '35202-8888888-8',
+                'error': 'Phone number 0300-8888888 belongs to another '
+                         'guardian',
+            }]
+        )
+
+
+class LegacyDuplicatePaymentTests(TestCase):
+    """
+    Migration 0013 left the older payments of a student and month
+    without a billing_month, next to the newest one that has it.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        guardian = Guardian.objects.create(
+            cnic='35202-3333333-3', phone_number='0300-3333333'
+        )
+        cls.student = Student.objects.create(name='Ali', guardian=guardian)
+        cls.older = FeePayment.objects.create(
+            student=cls.student, amount=5000,
+            month_paid_for=datetime.date(2026, 9, 5), status='pending',
+        )
+        FeePayment.objects.filter(pk=cls.older.pk).update(billing_month=None)
+        cls.newer = FeePayment.objects.create(
+            student=cls.student, amount=5000,
+            month_paid_for=datetime.date(2026, 9, 1), status='paid',
+        )
+
+    def test_saving_a_legacy_duplicate(self):
+        older = FeePayment.objects.get(pk=self.older.pk)
+        older.status = 'late'
+        older.save()
+        older.refresh_from_db()
+        self.assertEqual(older.status, 'late')
+        self.assertIsNone(older.billing_month)
+
+    def test_legacy_duplicate_moved_to_a_free_month(self):
+        older = FeePayment.objects.get(pk=self.older.pk)
+        older.month_paid_for = datetime.date(2026, 8, 1)
+        older.save()
+        older.refresh_from_db()
+        self.assertEqual(older.billing_month, datetime.date(2026, 8, 1))
+
+    def test_month_filter_lists_legacy_duplicates(self):
+        response = APIClient().get(
+            '/api/payments/', {'month': '2026-09', 'student': self.student.id}
+        )
+        self.assertEqual(
+            {row['id'] for row in response.data['results']},
+            {self.older.id, self.newer.id}
+        )
+
+
+class FeePaymentUpsertTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        guardian = Guardian.objects.create(
+            cnic='35202-4444444-4', phone_number='0300-4444444'
+        )
+        cls.student = Student.objects.create(name='Ali', guardian=guardian)
+
+    def upsert(self, update_fields, **values):
+        payment = FeePayment(student=self.student, **values)
+        return payment, upsert_fee_payment(payment, update_fields)
+
+    def test_second_payment_of_a_month_updates_the_first(self):
+        first, created = self.upsert(
+            ['amount', 'month_paid_for', 'status'], amount=5000,
+            month_paid_for=datetime.date(2026, 10, 1), status='pending',
+        )
+        self.assertTrue(created)
+        second, created = self.upsert(
+            ['status'], amount=1,
+            month_paid_for=datetime.date(2026, 10, 20), status='paid',
+        )
+        self.assertFalse(created)
+        self.assertEqual(second.pk, first.pk)
+        # Only the sent fields are overwritten
+        self.assertEqual(second.status, 'paid')
+        self.assertEqual(second.amount, 5000)
+        self.assertEqual(FeePayment.objects.count(), 1)
+        self.student.refresh_from_db()
+        self.assertEqual(self.student.latest_fee_status, 'paid')
+
+
+class FeePaymentUpsertRaceTests(TransactionTestCase):
+    """
+    Two first posts for the same student and month, each in its own
+    transaction and connection.
+    """
+
+    def setUp(self):
+        guardian = Guardian.objects.create(
+            cnic='35202-4444444-4', phone_number='0300-4444444'
+        )
+        self.student = Student.objects.create(name='Ali', guardian=guardian)
+
+    def test_concurrent_first_posts(self):
+        first_written = threading.Event()
+        second_started = threading.Event()
+        created = {}
+
+        def post(name, amount):
+            try:
+                with transaction.atomic():
+                    created[name] = upsert_fee_payment(
+                        FeePayment(
+                            student_id=self.student.id, amount=amount,
+                            month_paid_for=datetime.date(2026, 10, 1),
+                            status='pending',
+                        ),
+                        ['amount', 'month_paid_for', 'status'],
+                    )
+                    if name == 'first':
+                        # Commit only once the second post is under way
+                        first_written.set()
+                        second_started.wait(5)
+                        time.sleep(0.5)
+            finally:
+                connections.close_all()
+
+        first = threading.Thread(target=post, args=('first', 5000))
+        first.start()
+        first_written.wait(5)
+        second = threading.Thread(target=post, args=('second', 4500))
+        second.start()
+        second_started.set()
+        first.join(10)
+        second.join(10)
+
+        self.assertEqual(created, {'first': True, 'second': False})
+        payment = FeePayment.objects.get()
+        self.assertEqual(payment.amount, 4500)
+        ledger = MonthlyLedger.objects.exclude(entries=0).values_list(
+            'total', 'entries'
+        )
+        self.assertEqual(list(ledger), [(4500, 1)])
+
+
+class MonthlyLedgerTests(TestCase):
+    """
+    After every write path the incrementally kept ledger must equal
+    what reconcile_ledger() rebuilds from the payments and expenses.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.guardian = Guardian.objects.create(
+            cnic='35202-5555555-5', phone_number='0300-5555555'
+        )
+        cls.student = Student.objects.create(
+            name='Ali', guardian=cls.guardian, grade='3'
+        )
+
+    def ledger_rows(self):
+        return sorted(
+            MonthlyLedger.objects.exclude(total=0, entries=0).values_list(
+                'month', 'source', 'category', 'status', 'total', 'entries'
+            )
+        )
+
+    def assertLedgerMatchesRebuild(self):
+        live = self.ledger_rows()
+        self.assertTrue(live)
+        reconcile_ledger()
+        self.assertEqual(live, self.ledger_rows())
+
+    def create_payment(self, **values):
+        values = {
+            'amount': 5000, 'month_paid_for': datetime.date(2026, 9, 1),
+            'status': 'pending', **values,
+        }
+        return FeePayment.objects.create(student=self.student, **values)
+
+    def test_create(self):
+        self.create_payment()
+        self.create_payment(month_paid_for=datetime.date(2026, 10, 1))
+        self.assertLedgerMatchesRebuild()
+
+    def test_amount_status_and_month_changes(self):
+        payment = self.create_payment()
+        payment.amount = 4500
+        payment.save()
+        self.assertLedgerMatchesRebuild()
+        payment.status = 'paid'
+        payment.save()
+        self.assertLedgerMatchesRebuild()
+        payment.month_paid_for = datetime.date(2026, 8, 1)
+        payment.save()
+        self.assertLedgerMatchesRebuild()
+
+    def test_delete(self):
+        self.create_payment().delete()
+        self.create_payment(month_paid_for=datetime.date(2026, 10, 1))
+        self.assertLedgerMatchesRebuild()
+
+    def test_upsert_insert_and_update(self):
+        upsert_fee_payment(FeePayment(
+            student=self.student, amount=5000,
+            month_paid_for=datetime.date(2026, 9, 1), status='pending',
+        ), ['amount', 'month_paid_for', 'status'])
+        self.assertLedgerMatchesRebuild()
+        upsert_fee_payment(FeePayment(
+            student=self.student, amount=5500,
+            month_paid_for=datetime.date(2026, 9, 15), status='paid',
+        ), ['amount', 'month_paid_for', 'status'])
+        self.assertLedgerMatchesRebuild()
+        self.assertEqual(FeePayment.objects.count(), 1)
+
+    def test_create_monthly_fees(self):
+        FeeSchedule.objects.create(grade='3', amount=3000)
+        self.create_payment(month_paid_for=datetime.date(2026, 11, 1))
+        self.assertEqual(create_monthly_fees(datetime.date(2026, 10, 1)), 1)
+        self.assertEqual(create_monthly_fees(datetime.date(2026, 11, 1)), 0)
+        self.assertLedgerMatchesRebuild()
+        self.student.refresh_from_db()
+        self.assertEqual(self.student.latest_fee_amount, 3000)
+
+    def test_enroll_rows(self):
+        enroll_students(self.guardian, [
+            {
+                'name': 'Sara', 'grade': '2', 'age': 7,
+                'initial_fee': {
+                    'amount': 4000, 'status': 'paid',
+                    'month_paid_for': '2026-10-01',
+                },
+            },
+            {
+                'name': 'Omar', 'grade': '1', 'age': 6,
+                'initial_fee': {'amount': 3500, 'status': 'pending'},
+            },
+        ])
+        self.assertLedgerMatchesRebuild()
+
+    def test_mark_payments_paid(self):
+        payments = [
+            self.create_payment(),
+            self.create_payment(month_paid_for=datetime.date(2026, 10, 1)),
+        ]
+        mark_payments_paid([payment.pk for payment in payments])
+        self.assertLedgerMatchesRebuild()
+
+    def test_expenses(self):
+        expense = Expense.objects.create(
+            title='Rent', amount=20000, category='rent', status='paid',
+            expense_date=datetime.date(2026, 10, 3),
+        )
+        expense.category = 'utilities'
+        expense.save()
+        Expense.objects.create(
+            title='Power', amount=3000, category='utilities',
+            expense_date=datetime.date(2026, 9, 3),
+        ).delete()
+        self.assertLedgerMatchesRebuild()
+
+
+class StatementReconciliationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.guardian = Guardian.objects.create(
+            cnic='35202-6666666-1', phone_number='0300-6666666'
+        )
+        cls.student = Student.objects.create(
+            name='Ali', guardian=cls.guardian
+        )
+        cls.september = cls.pay(cls.student, 9)
+        cls.october = cls.pay(cls.student, 10)
+
+    @staticmethod
+    def pay(student, month, amount=5000, status='pending'):
+        return FeePayment.objects.create(
+            student=student, amount=amount, status=status,
+            month_paid_for=datetime.date(2026, month, 1),
+        )
+
+    def reconcile(self, *rows, dry_run=False):
+        lines = ['date,reference,amount'] + [
+            f'2026-10-05,{reference},{amount}' for reference, amount in rows
+        ]
+        upload = io.BytesIO('\n'.join(lines).encode('utf-8'))
+        return reconcile_statement(upload, dry_run=dry_run)
+
+    def status_of(self, payment):
+        return FeePayment.objects.get(pk=payment.pk).status
+
+    def test_match_by_cnic(self):
+        report = self.reconcile(('35202-6666666-1', '5000'))
+        self.assertEqual(report['matched'], 1)
+        self.assertEqual(self.status_of(self.september), 'paid')
+
+    def test_match_by_local_and_international_phone(self):
+        report = self.reconcile(
+            ('0300-6666666', '"5,000.00"'), ('+92 300 6666666', '5000')
+        )
+        self.assertEqual(report['matched'], 2)
+        self.assertEqual(self.status_of(self.september), 'paid')
+        self.assertEqual(self.status_of(self.october), 'paid')
+
+    def test_oldest_month_is_settled_first(self):
+        report = self.reconcile(('0300-6666666', '5000'))
+        self.assertEqual(report['matches'][0]['payment'], self.september.pk)
+        self.assertEqual(self.status_of(self.october), 'pending')
+
+    def test_cnic_suffix_does_not_match_a_phone(self):
+        # The last 10 digits of this CNIC are this guardian's phone
+        other = Guardian.objects.create(
+            cnic='35202-7777777-7', phone_number='0012-3456789'
+        )
+        payment = self.pay(
+            Student.objects.create(name='Sara', guardian=other), 9,
+            amount=4000,
+        )
+        report = self.reconcile(('35201-2345678-9', '4000'))
+        self.assertEqual(report['matched'], 0)
+        self.assertEqual(self.status_of(payment), 'pending')
+
+    def test_payment_changed_after_indexing(self):
+        def stale_index():
+            index = build_unpaid_index()
+            FeePayment.objects.filter(pk=self.september.pk).update(
+                status='paid'
+            )
+            return index
+
+        with mock.patch('students.fees.build_unpaid_index', stale_index):
+            report = self.reconcile(('0300-6666666', '5000'))
+        self.assertEqual(report['matched'], 0)
+        self.assertEqual(
+            report['errors'][0]['error'],
+            'Payment was changed in the meantime'
+        )
+        self.assertEqual(self.status_of(self.october), 'pending')
+
+    def test_dry_run_writes_nothing(self):
+        report = self.reconcile(('0300-6666666', '5000'), dry_run=True)
+        self.assertEqual(report['matched'], 1)
+        self.assertEqual(self.status_of(self.september), 'pending')
+
+    def test_ledger_and_latest_fee_follow(self):
+        self.reconcile(('0300-6666666', '5000'), ('0300-6666666', '5000'))
+        self.student.refresh_from_db()
+        self.assertEqual(self.student.latest_fee_status, 'paid')
+        live = sorted(MonthlyLedger.objects.exclude(
+            total=0, entries=0
+        ).values_list('month', 'status', 'total', 'entries'))
+        reconcile_ledger()
+        self.assertEqual(live, sorted(MonthlyLedger.objects.exclude(
+            total=0, entries=0
+        ).values_list('month', 'status', 'total', 'entries')))
+        self.assertEqual(
+            {status for _, status, _, _ in live}, {'paid'}
+        )
+
+
+class StagedImageTests(TestCase):
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        media_root = override_settings(MEDIA_ROOT=media.name)
+        media_root.enable()
+        self.addCleanup(media_root.disable)
+
+        output = io.BytesIO()
+        Image.new('RGB', (20, 20)).save(output, format='PNG')
+        self.staged_name = default_storage.save(
+            f'{STAGING_DIR}photo.png', ContentFile(output.getvalue())
+        )
+        guardian = Guardian.objects.create(
+            cnic='35202-7777777-7', phone_number='0300-7777777'
+        )
+        self.student = Student.objects.create(name='Ali', guardian=guardian)
+
+    def test_decompression_bomb_is_an_invalid_image(self):
+        # Pillow refuses images above twice its MAX_IMAGE_PIXELS
+        with mock.patch.object(Image, 'MAX_IMAGE_PIXELS', 100):
+            with self.assertRaisesMessage(
+                InvalidImage, 'Image dimensions are too large'
+            ):
+                clean_staged_image(self.staged_name)
+            result = process_student_image.apply(
+                args=(self.student.id, self.staged_name)
+            ).get()
+        self.assertEqual(result['status'], 'error')
+        self.assertFalse(default_storage.exists(self.staged_name))
+
+    def test_final_failure_removes_the_staged_file(self):
+        with mock.patch(
+            'students.tasks.clean_staged_image',
+            side_effect=RuntimeError('storage is down'),
+        ):
+            result = process_student_image.apply(
+                args=(self.student.id, self.staged_name), retries=3
+            )
+        self.assertIsInstance(result.result, RuntimeError)
+        self.assertFalse(default_storage.exists(self.staged_name))
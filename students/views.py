@@ -1,21 +1,19 @@
+import datetime
+import json
 import traceback
-import base64
-import uuid
 import calendar
 
 from django.db import transaction
-from django.db.models.functions import TruncMonth
-from django.db import models
-from django.core.files.base import ContentFile
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
+from django.utils.decorators import method_decorator
 from django.db.models import (
     Sum, Q, Case, When, IntegerField,
-    Subquery, OuterRef, Avg, F, Window,
-    Count
+    Avg, F, Window,
+    Count, Prefetch, OuterRef, Subquery, Value, DecimalField
 )
-from django.db.models.functions import DenseRank
-from django.core.cache import cache
+from django.db.models.functions import Coalesce, DenseRank
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
 
 from rest_framework.views import APIView
 from rest_framework.response import Response
@@ -23,6 +21,7 @@ from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 from django.utils.dateparse import parse_date
 from rest_framework import status
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.exceptions import NotFound, ParseError, ValidationError
 from drf_spectacular.utils import (
     extend_schema, OpenApiParameter,
     OpenApiResponse, OpenApiExample
@@ -33,28 +32,65 @@ from drf_spectacular.types import OpenApiTypes
 from .models import (
     CustomUser, Student,
     Guardian, FeePayment, Expense, StudentTestRecords,
-    StudentAttendance, TeacherAttendance, Teacher, Subject
+    StudentAttendance, TeacherAttendance, Teacher, Subject,
+    SalaryPayment, TeacherSubject, StudentImportJob, MonthlyLedger,
+    LedgerSource, billing_month_of
 )
 
 from .manager import get_tokens_for_user
-from .tasks import send_message
+from .cache import bump_cache_version, get_or_build
+from .conditional import conditional_get
+from .enrollment import enroll_students
+from .export import EXPORT_FORMATS, STUDENT_EXPORT_COLUMNS, stream_export
+from .fees import (
+    STATEMENT_COLUMNS, reconcile_statement, upsert_fee_payment
+)
+from .guardians import upsert_guardians
+from .images import (
+    is_new_image, schedule_image_processing, stage_image
+)
+from .imports import IMPORT_COLUMNS, REQUIRED_COLUMNS
+from .pagination import KeysetPagination, get_list_paginator
+from .search import (
+    search_students, rank_students, search_guardians, rank_guardians
+)
+from .tasks import run_student_import, send_message
 
 from .serializers import (
     CreateStudentSerializer,
     CustomStudentSerializer, StudentListSerializer,
     CreateGuardianSerializer, StudentDetailSerializer,
     FeePaymentSerializer, DashboardStatsSerializer,
-    GuardianDetailSerializer, ReadExpenseSerializer,
+    GuardianDetailSerializer, GuardianListSerializer, ReadExpenseSerializer,
     CreateExpenseSerializer, BulkTestRecordsSerializer,
     ReadTestRecordsSerializer,
-    BulkStudentAttendanceInputSerializer,
+    BulkStudentAttendanceInputSerializer, StudentAttendanceSerializer,
     BulkTeacherAttendanceInputSerializer,
     SubjectSerializer, TeacherListSerializer, TeacherDetailSerializer,
     CreateTeacherSerializer, SalaryPaymentSerializer,
-    CreateSalaryPaymentSerializer
+    CreateSalaryPaymentSerializer, StudentImportJobSerializer,
+    get_sparse_fieldsets
 )
 
 
+STUDENT_LIST_CACHE_TIMEOUT = 60 * 5
+DASHBOARD_CACHE_TIMEOUT = 60 * 5
+FINANCE_CACHE_TIMEOUT = 60 * 15
+# History embedded in the student detail; the rest is served by the
+# attendance and payments sub-resources
+STUDENT_DETAIL_ATTENDANCE_DAYS = 90
+STUDENT_DETAIL_PAYMENT_MONTHS = 12
+GUARDIAN_LIST_ORDERINGS = [
+    'name', '-name', 'cnic', '-cnic', 'created_at', '-created_at',
+    'student_count', '-student_count',
+    'active_student_count', '-active_student_count',
+    'pending_fee_total', '-pending_fee_total',
+]
+STUDENT_LIST_ORDERINGS = [
+    'name', '-name', 'grade', '-grade', 'date_joined', '-date_joined'
+]
+
+
 class StudentPagination(PageNumberPagination):
     page_size = 10
     page_size_query_param = 'page_size'
@@ -159,8 +195,158 @@ class SecureLoginAPIView(APIView):
             )
 
 
-class ListCreateStudentAPIView(APIView):
-    parser_classes = (JSONParser,)
+def get_student_summary(queryset):
+    """
+    Student and fee totals for a filtered student queryset, computed
+    with conditional aggregation in a single query.
+    """
+    pending = Q(payments__status='pending')
+    paid = Q(payments__status='paid')
+    summary = queryset.order_by().aggregate(
+        total_students=Count('id', distinct=True),
+        active_students=Count(
+            'id', filter=Q(is_active=True), distinct=True
+        ),
+        total_pending_fees=Sum('payments__amount', filter=pending),
+        pending_fee_count=Count('payments', filter=pending),
+        total_fees_paid=Sum('payments__amount', filter=paid),
+        paid_fee_count=Count('payments', filter=paid),
+    )
+    summary['total_pending_fees'] = summary['total_pending_fees'] or 0
+    summary['total_fees_paid'] = summary['total_fees_paid'] or 0
+    return summary
+
+
+def annotate_guardian_totals(queryset):
+    """
+    Annotate `student_count`, `active_student_count` and
+    `pending_fee_total` on guardians in the same query. The fee total
+    is a correlated subquery so the payments join cannot multiply the
+    student counts.
+    """
+    pending_fees = FeePayment.objects.filter(
+        student__guardian=OuterRef('pk'), status='pending'
+    ).values('student__guardian').annotate(
+        total=Sum('amount')
+    ).values('total')
+    return queryset.annotate(
+        student_count=Count('students'),
+        active_student_count=Count(
+            'students', filter=Q(students__is_active=True)
+        ),
+        pending_fee_total=Coalesce(
+            Subquery(pending_fees), Value(0),
+            output_field=DecimalField(max_digits=12, decimal_places=2)
+        ),
+    )
+
+
+def filter_students(queryset, params):
+    """
+    Apply the `grade`, `is_active` and `search` filters of the student
+    list to `queryset`. Shared by the list and export endpoints.
+    """
+    grade = params.get('grade')
+    if grade:
+        queryset = queryset.filter(grade=grade)
+
+    is_active = params.get('is_active')
+    if is_active is not None:
+        queryset = queryset.filter(is_active=is_active.lower() == 'true')
+
+    search = params.get('search')
+    if search:
+        queryset = search_students(queryset, search)
+    return queryset
+
+
+class ImageUploadMixin:
+    """
+    For views taking student photos as multipart file parts. Every part
+    is spooled to a temporary file by Django's upload handler, never to
+    memory, so FileSystemStorage moves it into the staging area instead
+    of copying its bytes.
+    """
+    parser_classes = (JSONParser, MultiPartParser, FormParser)
+
+    def initialize_request(self, request, *args, **kwargs):
+        request.upload_handlers = [TemporaryFileUploadHandler(request)]
+        return super().initialize_request(request, *args, **kwargs)
+
+
+def get_multipart_payload(request):
+    """
+    The JSON body of a request. Multipart requests carry it as a JSON
+    string in their `data` part, next to the file parts.
+    """
+    if not request.content_type.startswith('multipart/'):
+        return request.data
+    try:
+        payload = json.loads(request.data.get('data') or '{}')
+    except ValueError:
+        raise ParseError('The data part must be valid JSON')
+    if not isinstance(payload, dict):
+        raise ParseError('The data part must be a JSON object')
+    return payload
+
+
+class ListCreateStudentAPIView(ImageUploadMixin, APIView):
+
+    def build_list(self, request):
+        """Page of students plus the summary, as cached by get()."""
+        queryset = filter_students(
+            Student.objects.all(), request.query_params
+        )
+        search = request.query_params.get('search')
+        rank = bool(search) and (
+            request.query_params.get('search_mode') == 'rank'
+        )
+
+        # Summary over the filtered students, before any annotation
+        summary = get_student_summary(queryset)
+
+        sparse = get_sparse_fieldsets(request)
+        queryset = StudentListSerializer.optimize_queryset(
+            queryset, **sparse
+        )
+        if rank:
+            queryset = rank_students(queryset, search)
+
+        # Sorting - only apply custom ordering if explicitly requested
+        ordering = request.query_params.get('ordering')
+        order_fields = []
+        if ordering:
+            if ordering in STUDENT_LIST_ORDERINGS:
+                order_fields = [ordering]
+        elif rank:
+            order_fields = ['-search_rank', '-id']
+        else:
+            queryset = queryset.annotate(
+                pending_priority=Case(
+                    When(latest_fee_status='pending', then=0),
+                    When(latest_fee_status='paid', then=1),
+                    default=2,
+                    output_field=IntegerField(),
+                )
+            )
+            order_fields = ['pending_priority', '-id']
+        if order_fields:
+            queryset = queryset.order_by(*order_fields)
+
+        # Pagination
+        paginator = get_list_paginator(
+            request, order_fields, StudentPagination
+        )
+        paginated_students = paginator.paginate_queryset(
+            queryset, request
+        )
+
+        serializer = StudentListSerializer(
+            paginated_students, many=True, **sparse
+        )
+        response = paginator.get_paginated_response(serializer.data)
+        response.data['summary'] = summary
+        return response.data
 
     @extend_schema(
         summary="List Students",
@@ -181,7 +367,18 @@ class ListCreateStudentAPIView(APIView):
                 location=OpenApiParameter.QUERY,
                 description=(
                     'Search by student name, guardian name, '
-                    'or guardian phone number (partial match)'
+                    'guardian phone number or CNIC (partial match, '
+                    'dashes in numbers are ignored)'
+                )
+            ),
+            OpenApiParameter(
+                name='search_mode',
+                type=OpenApiTypes.STR,
+                location=OpenApiParameter.QUERY,
+                enum=['rank'],
+                description=(
+                    'Order search results by similarity to the search '
+                    'term unless an explicit ordering is given'
                 )
             ),
             OpenApiParameter(
@@ -205,6 +402,40 @@ class ListCreateStudentAPIView(APIView):
                     'Prefix with - for descending (e.g., -name)'
                 )
             ),
+            OpenApiParameter(
+                name='fields',
+                type=OpenApiTypes.STR,
+                location=OpenApiParameter.QUERY,
+                description=(
+                    'Comma separated fields to return '
+                    '(e.g., id,name,latest_fee_status)'
+                )
+            ),
+            OpenApiParameter(
+                name='pagination',
+                type=OpenApiTypes.STR,
+                location=OpenApiParameter.QUERY,
+                enum=['page', 'cursor'],
+                description=(
+                    'Pagination mode. "cursor" pages by keyset and '
+                    'returns next/previous cursor links instead of pages'
+                )
+            ),
+            OpenApiParameter(
+                name='cursor',
+                type=OpenApiTypes.STR,
+                location=OpenApiParameter.QUERY,
+                description='Opaque cursor taken from a next/previous link'
+            ),
+            OpenApiParameter(
+                name='count',
+                type=OpenApiTypes.BOOL,
+                location=OpenApiParameter.QUERY,
+                description=(
+                    'In cursor mode, include the total count '
+                    '(skipped unless true)'
+                )
+            ),
         ],
         responses={
             200: {
@@ -233,100 +464,26 @@ class ListCreateStudentAPIView(APIView):
         },
         tags=['Students']
     )
+    @method_decorator(conditional_get(Student, Guardian, FeePayment))
     def get(self, request):
         try:
-            # Get the latest payment status using Subquery
-            latest_payment_status = FeePayment.objects.filter(
-                student=OuterRef('pk')
-            ).order_by('-date_paid').values('status')[:1]
-
-            # Cache key for this query
+            # One cached copy per query. A write to any of the models
+            # the list is built from invalidates it; expiry only marks
+            # it stale, and it is served while one worker rebuilds it.
             query_string = request.META.get('QUERY_STRING', '')
-            cache_key = f'student_data_{query_string}'
-
-            # Try to get cached data
-            cached_data = cache.get(cache_key)
-            if cached_data:
-                return Response(cached_data)
-
-            queryset = Student.objects.select_related(
-                'guardian'
-            ).prefetch_related('payments').annotate(
-                latest_status=Subquery(latest_payment_status)
+            data = get_or_build(
+                f'student_data_{query_string}',
+                (Student, Guardian, FeePayment),
+                lambda: self.build_list(request),
+                timeout=STUDENT_LIST_CACHE_TIMEOUT
             )
+            return Response(data)
 
-            # Filtering
-            grade = request.query_params.get('grade')
-            is_active = request.query_params.get('is_active')
-
-            if grade:
-                queryset = queryset.filter(grade=grade)
-
-            if is_active is not None:
-                is_active_bool = is_active.lower() == 'true'
-                queryset = queryset.filter(is_active=is_active_bool)
-
-            # Search
-            search = request.query_params.get('search')
-            if search:
-                queryset = queryset.filter(
-                    Q(name__icontains=search) |
-                    Q(guardian__name__icontains=search) |
-                    Q(guardian__phone_number__icontains=search) |
-                    Q(guardian__cnic__icontains=search)
-                )
-
-            # Sorting - only apply custom ordering if explicitly requested
-            ordering = request.query_params.get('ordering')
-            if ordering:
-                allowed_orderings = [
-                    'name', '-name', 'grade', '-grade',
-                    'date_joined', '-date_joined'
-                ]
-                if ordering in allowed_orderings:
-                    queryset = queryset.order_by(ordering)
-            else:
-                queryset = queryset.annotate(
-                    pending_priority=Case(
-                        When(latest_status='pending', then=0),
-                        When(latest_status='paid', then=1),
-                        default=2,
-                        output_field=IntegerField(),
-                    )
-                ).order_by('pending_priority', '-id')
-
-            # Pagination
-            paginator = StudentPagination()
-            paginated_students = paginator.paginate_queryset(
-                queryset, request
+        except NotFound as e:
+            return Response(
+                {'error': str(e.detail)},
+                status=status.HTTP_404_NOT_FOUND
             )
-
-            serializer = StudentListSerializer(paginated_students, many=True)
-            summary = {
-                'total_students': queryset.count(),
-                'active_students': queryset.filter(is_active=True).count(),
-                'total_pending_fees': FeePayment.objects.filter(
-                    student__in=queryset,
-                    status='pending'
-                ).aggregate(total=Sum('amount'))['total'] or 0,
-                'pending_fee_count': FeePayment.objects.filter(
-                    student__in=queryset,
-                    status='pending'
-                ).count(),
-                'total_fees_paid': FeePayment.objects.filter(
-                    student__in=queryset,
-                    status='paid'
-                ).aggregate(total=Sum('amount'))['total'] or 0,
-                'paid_fee_count': FeePayment.objects.filter(
-                    student__in=queryset,
-                    status='paid'
-                ).count(),
-            }
-            response = paginator.get_paginated_response(serializer.data)
-            response.data['summary'] = summary
-            cache.set(cache_key, response.data, timeout=60)
-            return response
-
         except Exception as e:
             traceback.print_exc()
             print("ERROR WHILE GETTING STUDENTS ====", str(e))
@@ -428,6 +585,21 @@ class ListCreateStudentAPIView(APIView):
                         'status': 'paid'
                     }
                 }
+            },
+            'multipart/form-data': {
+                'type': 'object',
+                'properties': {
+                    'data': {
+                        'type': 'string',
+                        'description': 'The JSON body above, as a string'
+                    },
+                    'student_image': {
+                        'type': 'string',
+                        'format': 'binary',
+                        'description': 'Student photo'
+                    }
+                },
+                'required': ['data']
             }
         },
         responses={
@@ -482,8 +654,11 @@ class ListCreateStudentAPIView(APIView):
         tags=['Students']
     )
     def post(self, request):
+        data = get_multipart_payload(request)
+        if 'student_image' in request.FILES:
+            data['student_image'] = request.FILES['student_image']
         try:
-            serializer = CreateStudentSerializer(data=request.data)
+            serializer = CreateStudentSerializer(data=data)
             if serializer.is_valid():
                 custom_response = serializer.save()
                 return Response({
@@ -494,6 +669,11 @@ class ListCreateStudentAPIView(APIView):
                 "message": "Invalid data",
                 "errors": serializer.errors
             }, status=status.HTTP_400_BAD_REQUEST)
+        except ValidationError as e:
+            return Response({
+                "message": "Invalid data",
+                "errors": e.detail
+            }, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             traceback.print_exc()
             print("ERROR WHILE CREATING STUDENT ==", str(e))
@@ -503,29 +683,170 @@ class ListCreateStudentAPIView(APIView):
             )
 
 
-def decode_base64_image(data):
-    if not isinstance(data, str):
-        return data
+class StudentExportAPIView(APIView):
+    @extend_schema(
+        summary="Export Students",
+        description=(
+            "Stream the student roster with guardian and latest fee "
+            "columns as CSV or NDJSON. Accepts the same grade, "
+            "is_active, search and ordering filters as the student list."
+        ),
+        parameters=[
+            OpenApiParameter(
+                'export_format', OpenApiTypes.STR, OpenApiParameter.QUERY,
+                enum=list(EXPORT_FORMATS),
+                description='Output format (default: csv)'
+            ),
+            OpenApiParameter(
+                'search', OpenApiTypes.STR, OpenApiParameter.QUERY,
+                description='Search by student or guardian details'
+            ),
+            OpenApiParameter(
+                'grade', OpenApiTypes.STR, OpenApiParameter.QUERY,
+                description='Filter by grade'
+            ),
+            OpenApiParameter(
+                'is_active', OpenApiTypes.BOOL, OpenApiParameter.QUERY,
+                description='Filter by active status (true/false)'
+            ),
+            OpenApiParameter(
+                'ordering', OpenApiTypes.STR, OpenApiParameter.QUERY,
+                description='Options: name, grade, date_joined (default: id)'
+            ),
+        ],
+        responses={
+            200: OpenApiResponse(description='CSV or NDJSON file'),
+            400: OpenApiResponse(description='Unknown export format'),
+        },
+        tags=['Students']
+    )
+    @method_decorator(conditional_get(Student, Guardian, FeePayment))
+    def get(self, request):
+        try:
+            export_format = request.query_params.get('export_format', 'csv')
+            if export_format not in EXPORT_FORMATS:
+                return Response(
+                    {
+                        'error': (
+                            'export_format must be one of: '
+                            f"{', '.join(EXPORT_FORMATS)}"
+                        )
+                    },
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            queryset = filter_students(
+                Student.objects.all(), request.query_params
+            )
+            ordering = request.query_params.get('ordering')
+            if ordering in STUDENT_LIST_ORDERINGS:
+                queryset = queryset.order_by(ordering, 'id')
+            else:
+                queryset = queryset.order_by('id')
+
+            return stream_export(
+                queryset, STUDENT_EXPORT_COLUMNS, export_format, 'students'
+            )
+        except Exception as e:
+            traceback.print_exc()
+            return Response(
+                {'error': str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+
+class StudentImportAPIView(APIView):
+    parser_classes = (MultiPartParser, FormParser)
 
-    if data.startswith('data:image'):
+    @extend_schema(
+        summary="Import Students",
+        description=(
+            "Upload a CSV roster of guardian, student and initial fee "
+            "rows. The file is stored and imported in the background; "
+            "poll the returned job for progress. Columns: "
+            f"{', '.join(IMPORT_COLUMNS)}. Required: "
+            f"{', '.join(REQUIRED_COLUMNS)}."
+        ),
+        request={
+            'multipart/form-data': {
+                'type': 'object',
+                'properties': {
+                    'file': {'type': 'string', 'format': 'binary'}
+                },
+                'required': ['file']
+            }
+        },
+        responses={
+            202: StudentImportJobSerializer,
+            400: OpenApiResponse(description='Missing or non-CSV file'),
+        },
+        tags=['Students']
+    )
+    def post(self, request):
         try:
-            format, imgstr = data.split(';base64,')
-            ext = format.split('/')[-1]
-            return ContentFile(
-                base64.b64decode(imgstr),
-                name=f"student_{uuid.uuid4()}.{ext}"
+            upload = request.FILES.get('file')
+            if not upload:
+                return Response(
+                    {'error': 'A CSV file is required'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            if not upload.name.lower().endswith('.csv'):
+                return Response(
+                    {'error': 'Only CSV files can be imported'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            with transaction.atomic():
+                job = StudentImportJob.objects.create(
+                    file=upload,
+                    created_by=(
+                        request.user
+                        if request.user.is_authenticated else None
+                    )
+                )
+                transaction.on_commit(
+                    lambda: run_student_import.delay(job.id)
+                )
+            return Response(
+                StudentImportJobSerializer(job).data,
+                status=status.HTTP_202_ACCEPTED
+            )
+        except Exception as e:
+            traceback.print_exc()
+            return Response(
+                {'error': str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
-        except Exception:
-            return None
 
-    if len(data) > 255:
-        return None
 
-    return data
+class StudentImportJobAPIView(APIView):
+    @extend_schema(
+        summary="Student Import Status",
+        description="Progress of a roster import: rows done and failed.",
+        responses={
+            200: StudentImportJobSerializer,
+            404: OpenApiResponse(description='Import job not found'),
+        },
+        tags=['Students']
+    )
+    def get(self, request, job_id):
+        try:
+            job = StudentImportJob.objects.get(pk=job_id)
+            return Response(StudentImportJobSerializer(job).data)
+        except StudentImportJob.DoesNotExist:
+            return Response(
+                {'error': 'Import job not found'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        except Exception as e:
+            traceback.print_exc()
+            return Response(
+                {'error': str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
 
 
-class BulkEnrollStudentAPIView(APIView):
-    parser_classes = (JSONParser,)
+class BulkEnrollStudentAPIView(ImageUploadMixin, APIView):
 
     @extend_schema(
         summary="Bulk Enroll Students",
@@ -639,6 +960,24 @@ class BulkEnrollStudentAPIView(APIView):
                         }
                     ]
                 }
+            },
+            'multipart/form-data': {
+                'type': 'object',
+                'properties': {
+                    'data': {
+                        'type': 'string',
+                        'description': 'The JSON body above, as a string'
+                    },
+                    'student_image_0': {
+                        'type': 'string',
+                        'format': 'binary',
+                        'description': (
+                            'Photo of students[0]; student_image_1 for '
+                            'students[1] and so on'
+                        )
+                    }
+                },
+                'required': ['data']
             }
         },
         responses={
@@ -658,11 +997,26 @@ class BulkEnrollStudentAPIView(APIView):
                 }
             },
             400: {
-                'description': 'Invalid data',
+                'description': (
+                    'One or more students were rejected; nothing was '
+                    'enrolled'
+                ),
                 'content': {
                     'application/json': {
                         'example': {
-                            'error': 'Guardian data is required'
+                            'status': 'error',
+                            'message': 'No students were enrolled',
+                            'errors': [
+                                {
+                                    'index': 1,
+                                    'name': 'Sara Khan',
+                                    'error': (
+                                        'Student with name Sara Khan age '
+                                        '13 and guardian is Ahmed Khan '
+                                        'already exists'
+                                    )
+                                }
+                            ]
                         }
                     }
                 }
@@ -679,66 +1033,44 @@ class BulkEnrollStudentAPIView(APIView):
         tags=['Students']
     )
     def post(self, request):
-        data = request.data
+        data = get_multipart_payload(request)
         guardian_data = data.get('guardian')
         students_list = data.get('students')
+        for index, student_data in enumerate(students_list or []):
+            upload = request.FILES.get(f'student_image_{index}')
+            if upload:
+                student_data['student_image'] = upload
 
         with transaction.atomic():
-            guardian, created = Guardian.objects.get_or_create(
-                cnic=guardian_data['cnic'],
-                defaults=guardian_data
+            # An existing guardian gets the phone number and address sent
+            guardians, errors = upsert_guardians(
+                [guardian_data],
+                update_fields=[
+                    field for field in ('phone_number', 'address')
+                    if field in guardian_data
+                ]
             )
+            if errors:
+                return Response({
+                    'status': 'error',
+                    'message': 'No students were enrolled',
+                    'errors': errors
+                }, status=status.HTTP_400_BAD_REQUEST)
+            guardian = guardians[guardian_data['cnic']]
 
-            if not created:
-                guardian.phone_number = guardian_data.get(
-                    'phone_number', guardian.phone_number
-                )
-                guardian.address = guardian_data.get(
-                    'address', guardian.address
-                )
-                guardian.save()
-
-            created_students = []
-            for student_data in students_list:
-                fee_data = student_data.pop('initial_fee', None)
-                image_data = student_data.pop('student_image', None)
-
-                if Student.objects.filter(
-                    name=student_data['name'],
-                    guardian=guardian,
-                    grade=student_data['grade'],
-                    age=student_data['age']
-                ).exists():
-                    message = (
-                        f"Student with name {student_data['name']} age "
-                        f"{student_data['age']} and guardian is "
-                        f"{guardian.name} already exists"
-                    )
-                    return Response({
-                        'status': 'error',
-                        'message': message
-                    }, status=status.HTTP_400_BAD_REQUEST)
-
-                # Fix for age field error if it's passed as empty string
-                if student_data.get('age') == "":
-                    student_data['age'] = None
-
-                if image_data:
-                    student_data['student_image'] = decode_base64_image(
-                        image_data
-                    )
-
-                student = Student.objects.create(
-                    guardian=guardian, **student_data
-                )
-                if fee_data:
-                    FeePayment.objects.create(student=student, **fee_data)
-
-                created_students.append({
-                    "id": student.id,
-                    "name": student.name
-                })
+            students, errors = enroll_students(guardian, students_list)
+            if errors:
+                transaction.set_rollback(True)
+                return Response({
+                    'status': 'error',
+                    'message': 'No students were enrolled',
+                    'errors': errors
+                }, status=status.HTTP_400_BAD_REQUEST)
 
+        created_students = [
+            {"id": student.id, "name": student.name}
+            for student in students
+        ]
         return Response({
             "status": "success",
             "total_enrolled": len(created_students),
@@ -746,10 +1078,27 @@ class BulkEnrollStudentAPIView(APIView):
         })
 
 
-class StudentDetailAPIView(APIView):
+def get_history_windows(today):
+    """Oldest attendance date and fee month shown on the student detail."""
+    attendance_since = today - datetime.timedelta(
+        days=STUDENT_DETAIL_ATTENDANCE_DAYS
+    )
+    months = today.year * 12 + today.month - STUDENT_DETAIL_PAYMENT_MONTHS
+    payments_since = datetime.date(months // 12, months % 12 + 1, 1)
+    return attendance_since, payments_since
+
+
+class StudentDetailAPIView(ImageUploadMixin, APIView):
     @extend_schema(
         summary="Retrieve Student Details",
-        description="Get detailed information about a specific student by ID.",
+        description=(
+            "Get detailed information about a specific student by ID. "
+            f"Only the last {STUDENT_DETAIL_ATTENDANCE_DAYS} days of "
+            f"attendance and {STUDENT_DETAIL_PAYMENT_MONTHS} months of "
+            "fee payments are included, newest first; the full history "
+            "is at /api/students/<id>/attendance/ and /payments/. The "
+            "fee totals cover every payment."
+        ),
         responses={
             200: {
                 'description': 'Student details retrieved successfully',
@@ -780,11 +1129,44 @@ class StudentDetailAPIView(APIView):
         },
         tags=['Students']
     )
+    @method_decorator(conditional_get(
+        Student, Guardian, FeePayment, StudentAttendance
+    ))
     def get(self, request, student_id):
         try:
+            attendance_since, payments_since = get_history_windows(
+                timezone.localdate()
+            )
+            # Fee totals come from the same query as the student, so
+            # the page costs three queries however long the history is
             student = Student.objects.select_related(
                 'guardian'
-            ).prefetch_related('payments').get(id=student_id)
+            ).annotate(
+                total_fees_paid=Sum(
+                    'payments__amount', filter=Q(payments__status='paid')
+                ),
+                total_fees_pending=Sum(
+                    'payments__amount', filter=Q(payments__status='pending')
+                ),
+                payment_count=Count('payments'),
+            ).prefetch_related(
+                Prefetch(
+                    'payments',
+                    queryset=FeePayment.objects.filter(
+                        Q(month_paid_for__gte=payments_since) |
+                        Q(
+                            month_paid_for__isnull=True,
+                            date_paid__gte=payments_since
+                        )
+                    ).order_by('-month_paid_for', '-id')
+                ),
+                Prefetch(
+                    'attendance',
+                    queryset=StudentAttendance.objects.filter(
+                        date__gte=attendance_since
+                    ).select_related('student').order_by('-date')
+                ),
+            ).get(id=student_id)
             serializer = StudentDetailSerializer(student)
             return Response(serializer.data, status=status.HTTP_200_OK)
         except Student.DoesNotExist:
@@ -811,6 +1193,20 @@ class StudentDetailAPIView(APIView):
                     'grade': '12',
                     'is_active': False
                 }
+            },
+            'multipart/form-data': {
+                'type': 'object',
+                'properties': {
+                    'data': {
+                        'type': 'string',
+                        'description': 'The JSON body above, as a string'
+                    },
+                    'student_image': {
+                        'type': 'string',
+                        'format': 'binary',
+                        'description': 'New student photo'
+                    }
+                }
             }
         },
         responses={
@@ -850,16 +1246,20 @@ class StudentDetailAPIView(APIView):
         tags=['Students']
     )
     def patch(self, request, student_id):
+        data = get_multipart_payload(request)
+        if 'student_image' in request.FILES:
+            data['student_image'] = request.FILES['student_image']
         try:
             student = Student.objects.get(id=student_id)
+            staged_image = None
 
             allowed_fields = [
                 'name', 'age', 'grade', 'is_active',
                 'date_joined', 'student_image'
             ]
             for field in allowed_fields:
-                if field in request.data:
-                    value = request.data[field]
+                if field in data:
+                    value = data[field]
 
                     # Fix for the Age integer field error
                     if field == 'age' and value == "":
@@ -867,22 +1267,26 @@ class StudentDetailAPIView(APIView):
 
                     # Fix for student_image truncation and URL issues
                     if field == 'student_image':
-                        is_b64 = (
-                            value and isinstance(value, str) and
-                            value.startswith('data:image')
-                        )
-                        if is_b64:
-                            value = decode_base64_image(value)
+                        if is_new_image(value):
+                            # Processed off-request once the save commits
+                            staged_image = stage_image(value)
+                            continue
                         elif value and isinstance(value, str) and \
                                 value.startswith('http'):
                             # It's an existing URL, don't update the field
                             continue
                         elif not value:
                             value = None
+                        # The thumbnails belong to the previous photo
+                        student.student_image_64 = None
+                        student.student_image_256 = None
 
                     setattr(student, field, value)
 
-            student.save()
+            with transaction.atomic():
+                student.save()
+                if staged_image:
+                    schedule_image_processing(student.id, staged_image)
 
             serializer = StudentListSerializer(student)
             return Response({
@@ -932,23 +1336,137 @@ class StudentDetailAPIView(APIView):
         },
         tags=['Students']
     )
-    def delete(self, request, student_id):
+    def delete(self, request, student_id):
+        try:
+            student = Student.objects.get(id=student_id)
+            student_name = student.name
+            student.delete()
+
+            return Response({
+                'message': 'Student deleted successfully',
+                'deleted_student_id': student_id,
+                'deleted_student_name': student_name
+            }, status=status.HTTP_200_OK)
+
+        except Student.DoesNotExist:
+            return Response(
+                {'error': 'Student not found'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        except Exception as e:
+            traceback.print_exc()
+            return Response(
+                {'error': str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+
+class StudentAttendanceHistoryAPIView(APIView):
+    @extend_schema(
+        summary="Student Attendance History",
+        description=(
+            "Every attendance record of a student, newest first, with "
+            "cursor pagination. Follow the `next` and `previous` links; "
+            "`?count=true` adds the total."
+        ),
+        parameters=[
+            OpenApiParameter(
+                name='page_size', type=OpenApiTypes.INT,
+                location=OpenApiParameter.QUERY,
+                description='Records per page (max 100)'
+            ),
+            OpenApiParameter(
+                name='cursor', type=OpenApiTypes.STR,
+                location=OpenApiParameter.QUERY,
+                description='Cursor from a next or previous link'
+            ),
+            OpenApiParameter(
+                name='status', type=OpenApiTypes.STR,
+                location=OpenApiParameter.QUERY,
+                description='Only records with this status'
+            ),
+        ],
+        tags=['Students']
+    )
+    @method_decorator(conditional_get(Student, StudentAttendance))
+    def get(self, request, student_id):
+        try:
+            student = Student.objects.filter(id=student_id).first()
+            if student is None:
+                return Response(
+                    {'error': 'Student not found'},
+                    status=status.HTTP_404_NOT_FOUND
+                )
+            records = StudentAttendance.objects.filter(
+                student=student
+            )
+            record_status = request.query_params.get('status')
+            if record_status:
+                records = records.filter(status=record_status)
+
+            paginator = KeysetPagination(['-date'])
+            page = paginator.paginate_queryset(records, request, view=self)
+            for record in page:
+                record.student = student
+            serializer = StudentAttendanceSerializer(page, many=True)
+            return paginator.get_paginated_response(serializer.data)
+        except NotFound:
+            raise
+        except Exception as e:
+            traceback.print_exc()
+            return Response(
+                {'error': str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+
+class StudentPaymentHistoryAPIView(APIView):
+    @extend_schema(
+        summary="Student Payment History",
+        description=(
+            "Every fee payment of a student, newest fee month first, "
+            "with cursor pagination. Follow the `next` and `previous` "
+            "links; `?count=true` adds the total."
+        ),
+        parameters=[
+            OpenApiParameter(
+                name='page_size', type=OpenApiTypes.INT,
+                location=OpenApiParameter.QUERY,
+                description='Payments per page (max 100)'
+            ),
+            OpenApiParameter(
+                name='cursor', type=OpenApiTypes.STR,
+                location=OpenApiParameter.QUERY,
+                description='Cursor from a next or previous link'
+            ),
+            OpenApiParameter(
+                name='status', type=OpenApiTypes.STR,
+                location=OpenApiParameter.QUERY,
+                description='Only payments with this status'
+            ),
+        ],
+        tags=['Students']
+    )
+    @method_decorator(conditional_get(Student, FeePayment))
+    def get(self, request, student_id):
         try:
-            student = Student.objects.get(id=student_id)
-            student_name = student.name
-            student.delete()
-
-            return Response({
-                'message': 'Student deleted successfully',
-                'deleted_student_id': student_id,
-                'deleted_student_name': student_name
-            }, status=status.HTTP_200_OK)
-
-        except Student.DoesNotExist:
-            return Response(
-                {'error': 'Student not found'},
-                status=status.HTTP_404_NOT_FOUND
-            )
+            student = Student.objects.filter(id=student_id).first()
+            if student is None:
+                return Response(
+                    {'error': 'Student not found'},
+                    status=status.HTTP_404_NOT_FOUND
+                )
+            payments = FeePayment.objects.filter(student=student)
+            payment_status = request.query_params.get('status')
+            if payment_status:
+                payments = payments.filter(status=payment_status)
+
+            paginator = KeysetPagination(['-month_paid_for'])
+            page = paginator.paginate_queryset(payments, request, view=self)
+            serializer = FeePaymentSerializer(page, many=True)
+            return paginator.get_paginated_response(serializer.data)
+        except NotFound:
+            raise
         except Exception as e:
             traceback.print_exc()
             return Response(
@@ -976,15 +1494,30 @@ class ListGuardianAPIView(APIView):
                 name='search',
                 type=OpenApiTypes.STR,
                 location=OpenApiParameter.QUERY,
-                description='Search by CNIC or name (partial match)'
+                description=(
+                    'Search by name, CNIC or phone number (partial match, '
+                    'dashes in numbers are ignored)'
+                )
+            ),
+            OpenApiParameter(
+                name='search_mode',
+                type=OpenApiTypes.STR,
+                location=OpenApiParameter.QUERY,
+                enum=['rank'],
+                description=(
+                    'Order search results by similarity to the search '
+                    'term unless an explicit ordering is given'
+                )
             ),
             OpenApiParameter(
                 name='ordering',
                 type=OpenApiTypes.STR,
                 location=OpenApiParameter.QUERY,
                 description=(
-                    'Sort by field. Options: name, cnic, created_at. '
-                    'Prefix with - for descending (e.g., -name)'
+                    'Sort by field. Options: name, cnic, created_at, '
+                    'student_count, active_student_count, '
+                    'pending_fee_total. Prefix with - for descending '
+                    '(e.g., -pending_fee_total)'
                 )
             ),
         ],
@@ -999,10 +1532,14 @@ class ListGuardianAPIView(APIView):
                             'previous': None,
                             'results': [
                                 {
+                                    'id': 1,
                                     'name': 'Ahmed Khan',
                                     'cnic': '31202-1234567-1',
                                     'phone_number': '0300-1234567',
-                                    'address': 'Model Town, Bahawalpur'
+                                    'address': 'Model Town, Bahawalpur',
+                                    'student_count': 2,
+                                    'active_student_count': 2,
+                                    'pending_fee_total': '5000.00'
                                 }
                             ]
                         }
@@ -1012,27 +1549,29 @@ class ListGuardianAPIView(APIView):
         },
         tags=['Guardians']
     )
+    @method_decorator(conditional_get(Guardian, Student, FeePayment))
     def get(self, request):
         try:
-            # Base queryset
-            queryset = Guardian.objects.all()
+            # Base queryset, with the family totals
+            queryset = annotate_guardian_totals(Guardian.objects.all())
 
-            # Search by CNIC or name
+            # Search by name, CNIC or phone number
             search = request.query_params.get('search')
+            rank = bool(search) and (
+                request.query_params.get('search_mode') == 'rank'
+            )
             if search:
-                from django.db.models import Q
-                queryset = queryset.filter(
-                    Q(cnic__icontains=search) | Q(name__icontains=search)
-                )
+                queryset = search_guardians(queryset, search)
+                if rank:
+                    queryset = rank_guardians(queryset, search)
 
-            # Sorting
-            ordering = request.query_params.get('ordering', '-created_at')
-            allowed_orderings = [
-                'name', '-name', 'cnic', '-cnic',
-                'created_at', '-created_at'
-            ]
-            if ordering in allowed_orderings:
-                queryset = queryset.order_by(ordering)
+            # Sorting, by similarity when ranking without explicit ordering
+            ordering = request.query_params.get('ordering')
+            if rank and not ordering:
+                queryset = queryset.order_by('-search_rank', '-id')
+            elif (ordering or '-created_at') in GUARDIAN_LIST_ORDERINGS:
+                # The id keeps pages stable when totals are tied
+                queryset = queryset.order_by(ordering or '-created_at', '-id')
 
             # Pagination
             paginator = StudentPagination()
@@ -1040,7 +1579,7 @@ class ListGuardianAPIView(APIView):
                 queryset, request
             )
 
-            serializer = CreateGuardianSerializer(
+            serializer = GuardianListSerializer(
                 paginated_guardians, many=True
             )
             return paginator.get_paginated_response(serializer.data)
@@ -1153,10 +1692,169 @@ class ListGuardianAPIView(APIView):
             )
 
 
+class GuardianBulkUpsertAPIView(APIView):
+    parser_classes = (JSONParser,)
+
+    @extend_schema(
+        summary="Bulk Upsert Guardians",
+        description=(
+            "Create or update many guardians at once, matched by CNIC, "
+            "with one INSERT ... ON CONFLICT per 1000 records. For an "
+            "existing guardian, the name, phone_number and address "
+            "fields that every record carries are overwritten. Invalid "
+            "records, and records whose phone number belongs to another "
+            "guardian, are reported and skipped; the rest are written."
+        ),
+        request={
+            'application/json': {
+                'type': 'object',
+                'properties': {
+                    'guardians': {
+                        'type': 'array',
+                        'items': {
+                            'type': 'object',
+                            'properties': {
+                                'name': {'type': 'string'},
+                                'cnic': {'type': 'string'},
+                                'phone_number': {'type': 'string'},
+                                'address': {'type': 'string'}
+                            },
+                            'required': ['cnic', 'phone_number']
+                        }
+                    }
+                },
+                'required': ['guardians'],
+                'example': {
+                    'guardians': [
+                        {
+                            'name': 'Ahmed Khan',
+                            'cnic': '31202-1234567-1',
+                            'phone_number': '0300-1234567',
+                            'address': 'Model Town, Bahawalpur'
+                        }
+                    ]
+                }
+            }
+        },
+        responses={
+            200: {
+                'description': 'Guardians written',
+                'content': {
+                    'application/json': {
+                        'example': {
+                            'status': 'success',
+                            'total_upserted': 1,
+                            'guardians': [
+                                {'id': 1, 'cnic': '31202-1234567-1'}
+                            ],
+                            'errors': []
+                        }
+                    }
+                }
+            },
+            400: {
+                'description': 'No guardian could be written',
+                'content': {
+                    'application/json': {
+                        'example': {
+                            'status': 'error',
+                            'message': 'No guardians were written',
+                            'errors': [
+                                {
+                                    'index': 0,
+                                    'cnic': '31202-1234567-1',
+                                    'error': (
+                                        'Phone number 0300-1234567 '
+                                        'belongs to another guardian'
+                                    )
+                                }
+                            ]
+                        }
+                    }
+                }
+            }
+        },
+        tags=['Guardians']
+    )
+    def post(self, request):
+        records = request.data.get('guardians')
+        if not isinstance(records, list) or not records:
+            return Response({
+                'status': 'error',
+                'message': 'guardians must be a non-empty list'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            # Validated one by one so a bad record only rejects itself
+            serializer = CreateGuardianSerializer()
+            errors = []
+            valid = []
+            positions = []
+            for index, record in enumerate(records):
+                try:
+                    valid.append(serializer.run_validation(record))
+                except ValidationError as e:
+                    errors.append({
+                        'index': index,
+                        'cnic': (
+                            record.get('cnic')
+                            if isinstance(record, dict) else None
+                        ),
+                        'error': e.detail
+                    })
+                    continue
+                positions.append(index)
+
+            update_fields = [
+                field for field in ('name', 'phone_number', 'address')
+                if all(field in record for record in valid)
+            ]
+            with transaction.atomic():
+                guardians, rejected = upsert_guardians(
+                    valid, update_fields=update_fields
+                )
+            for error in rejected:
+                error['index'] = positions[error['index']]
+                errors.append(error)
+            errors.sort(key=lambda error: error['index'])
+
+            if not guardians:
+                return Response({
+                    'status': 'error',
+                    'message': 'No guardians were written',
+                    'errors': errors
+                }, status=status.HTTP_400_BAD_REQUEST)
+            return Response({
+                'status': 'success',
+                'total_upserted': len(guardians),
+                'guardians': [
+                    {'id': guardian.id, 'cnic': guardian.cnic}
+                    for guardian in guardians.values()
+                ],
+                'errors': errors
+            })
+        except Exception as e:
+            traceback.print_exc()
+            return Response(
+                {'error': str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+
 class GuardianDetailAPIView(APIView):
     @extend_schema(
         summary="Retrieve Guardian",
         description="Get details of a specific guardian by ID.",
+        parameters=[
+            OpenApiParameter(
+                'fields', OpenApiTypes.STR, OpenApiParameter.QUERY,
+                description='Comma separated fields to return'
+            ),
+            OpenApiParameter(
+                'expand', OpenApiTypes.STR, OpenApiParameter.QUERY,
+                description='Include nested data. Options: students'
+            ),
+        ],
         responses={
             200: {
                 'description': 'Guardian details',
@@ -1182,10 +1880,14 @@ class GuardianDetailAPIView(APIView):
         },
         tags=['Guardians']
     )
+    @method_decorator(conditional_get(Guardian, Student))
     def get(self, request, pk):
         try:
-            guardian = Guardian.objects.get(pk=pk)
-            serializer = GuardianDetailSerializer(guardian)
+            sparse = get_sparse_fieldsets(request)
+            guardian = GuardianDetailSerializer.optimize_queryset(
+                Guardian.objects.all(), **sparse
+            ).get(pk=pk)
+            serializer = GuardianDetailSerializer(guardian, **sparse)
             return Response(serializer.data)
         except Guardian.DoesNotExist:
             return Response(
@@ -1496,38 +2198,29 @@ class ListCreatePaymentAPIView(APIView):
                 "error": "Invalid date format"
             }, status=status.HTTP_400_BAD_REQUEST)
 
-        existing_payment = FeePayment.objects.filter(
-            student_id=student_id,
-            month_paid_for__year=payment_date.year,
-            month_paid_for__month=payment_date.month
-        ).first()
-
-        if existing_payment:
-            serializer = FeePaymentSerializer(
-                existing_payment, data=data, partial=True
-            )
-            action = "updated"
-            http_status = status.HTTP_200_OK
-        else:
-            serializer = FeePaymentSerializer(data=data)
-            action = "created"
-            http_status = status.HTTP_201_CREATED
-
+        serializer = FeePaymentSerializer(data=data)
         if serializer.is_valid():
-            serializer.save()
-            try:
-                Student.objects.get(id=student_id)
-            except Student.DoesNotExist:
-                return Response({
-                    "error": "Student not found"
-                }, status=status.HTTP_404_NOT_FOUND)
+            # A payment for the same month is updated in place, with
+            # only the fields that were sent
+            payment = FeePayment(**serializer.validated_data)
+            with transaction.atomic():
+                created = upsert_fee_payment(
+                    payment, update_fields=[
+                        field for field in serializer.validated_data
+                        if field != 'student'
+                    ]
+                )
+            action = "created" if created else "updated"
+            http_status = (
+                status.HTTP_201_CREATED if created else status.HTTP_200_OK
+            )
 
             return Response({
                 "message": (
                     f"Payment {action} successfully for "
                     f"{payment_date.strftime('%B %Y')}"
                 ),
-                "data": serializer.data
+                "data": FeePaymentSerializer(payment).data
             }, status=http_status)
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -1551,6 +2244,8 @@ class ListCreatePaymentAPIView(APIView):
         **Pagination:**
         - page: Page number (e.g., ?page=2)
         - page_size: Items per page (default: 10, max: 100)
+        - pagination=cursor: Keyset pagination; follow the next/previous
+          links, add count=true to include the total count
         """,
         parameters=[
             OpenApiParameter(
@@ -1594,6 +2289,19 @@ class ListCreatePaymentAPIView(APIView):
                 location=OpenApiParameter.QUERY,
                 description='Number of results per page (max: 100)'
             ),
+            OpenApiParameter(
+                name='pagination',
+                type=str,
+                location=OpenApiParameter.QUERY,
+                description='Pagination mode',
+                enum=['page', 'cursor']
+            ),
+            OpenApiParameter(
+                name='cursor',
+                type=str,
+                location=OpenApiParameter.QUERY,
+                description='Opaque cursor taken from a next/previous link'
+            ),
         ],
         responses={
             200: {
@@ -1625,6 +2333,7 @@ class ListCreatePaymentAPIView(APIView):
         },
         tags=['Payments']
     )
+    @method_decorator(conditional_get(FeePayment))
     def get(self, request):
         # Start with all payments
         queryset = FeePayment.objects.all()
@@ -1642,9 +2351,17 @@ class ListCreatePaymentAPIView(APIView):
         if month_filter:
             try:
                 year, month = month_filter.split('-')
+                first_day = datetime.date(int(year), int(month), 1)
+                next_month = (
+                    first_day + datetime.timedelta(days=32)
+                ).replace(day=1)
+                # Older duplicates of a month have no billing_month
                 queryset = queryset.filter(
-                    month_paid_for__year=int(year),
-                    month_paid_for__month=int(month)
+                    Q(billing_month=first_day) | Q(
+                        billing_month__isnull=True,
+                        month_paid_for__gte=first_day,
+                        month_paid_for__lt=next_month,
+                    )
                 )
             except (ValueError, AttributeError):
                 pass
@@ -1656,13 +2373,14 @@ class ListCreatePaymentAPIView(APIView):
             'amount', '-amount',
             'month_paid_for', '-month_paid_for'
         ]
-        if ordering in allowed_orderings:
-            queryset = queryset.order_by(ordering)
-        else:
-            queryset = queryset.order_by('-date_paid')
+        if ordering not in allowed_orderings:
+            ordering = '-date_paid'
+        queryset = queryset.order_by(ordering)
 
         # Pagination
-        paginator = StudentPagination()
+        paginator = get_list_paginator(
+            request, [ordering], StudentPagination
+        )
         paginated_queryset = paginator.paginate_queryset(
             queryset, request
         )
@@ -1671,33 +2389,149 @@ class ListCreatePaymentAPIView(APIView):
         return paginator.get_paginated_response(serializer.data)
 
 
+class FeeReconciliationAPIView(APIView):
+    parser_classes = (MultiPartParser, FormParser)
+
+    @extend_schema(
+        summary="Reconcile Bank Statement",
+        description=(
+            "Upload a bank statement CSV to mark the matching fee "
+            "payments paid. Columns: "
+            f"{', '.join(STATEMENT_COLUMNS)}; `reference` is the CNIC or "
+            "phone number of the guardian who paid. Each row is matched "
+            "to a pending or late payment of the same amount for that "
+            "guardian, oldest month first. No notification is sent for "
+            "the payments marked paid. Set dry_run=true to get the "
+            "report without applying it."
+        ),
+        request={
+            'multipart/form-data': {
+                'type': 'object',
+                'properties': {
+                    'file': {'type': 'string', 'format': 'binary'},
+                    'dry_run': {'type': 'boolean'},
+                },
+                'required': ['file']
+            }
+        },
+        responses={
+            200: {
+                'description': 'Match report',
+                'content': {
+                    'application/json': {
+                        'example': {
+                            'rows': 2,
+                            'matched': 1,
+                            'unmatched': 1,
+                            'dry_run': False,
+                            'matches': [
+                                {
+                                    'line': 2,
+                                    'date': '2026-02-03',
+                                    'reference': '0300-1234567',
+                                    'amount': '5000',
+                                    'payment': 41,
+                                    'student': 5,
+                                    'month': '2026-02-01'
+                                }
+                            ],
+                            'errors': [
+                                {
+                                    'line': 3,
+                                    'date': '2026-02-04',
+                                    'reference': '35202-1234567-1',
+                                    'amount': '4500',
+                                    'error': (
+                                        'No pending payment for this '
+                                        'CNIC/phone and amount'
+                                    )
+                                }
+                            ]
+                        }
+                    }
+                }
+            },
+            400: OpenApiResponse(
+                description='Missing, non-CSV or malformed file'
+            ),
+        },
+        tags=['Payments']
+    )
+    def post(self, request):
+        try:
+            upload = request.FILES.get('file')
+            if not upload:
+                return Response(
+                    {'error': 'A CSV file is required'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            if not upload.name.lower().endswith('.csv'):
+                return Response(
+                    {'error': 'Only CSV files can be reconciled'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            dry_run = str(
+                request.data.get('dry_run', '')
+            ).lower() in ('1', 'true', 'yes')
+
+            try:
+                report = reconcile_statement(upload, dry_run=dry_run)
+            except (ValueError, UnicodeDecodeError) as e:
+                return Response(
+                    {'error': str(e)}, status=status.HTTP_400_BAD_REQUEST
+                )
+            return Response(report, status=status.HTTP_200_OK)
+        except Exception as e:
+            traceback.print_exc()
+            return Response(
+                {'error': str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+
 class DashboardStatsAPIView(APIView):
+    def build_stats(self):
+        """
+        Three queries: the student counts, the fee totals summed over
+        the MonthlyLedger, and the recent students with their guardian.
+        fee_status comes from the latest_fee_* columns.
+        """
+        students = Student.objects.filter(
+            is_active=True
+        ).select_related('guardian').order_by('-created_at')[:5]
+        serializer = DashboardStatsSerializer(students, many=True)
+
+        def ledger_total(**filters):
+            return Coalesce(
+                Sum('total', filter=Q(**filters) if filters else None),
+                Value(0), output_field=DecimalField()
+            )
+
+        stats = Student.objects.aggregate(
+            total_students=Count('id'),
+            total_active_students=Count('id', filter=Q(is_active=True)),
+        )
+        stats.update(MonthlyLedger.objects.filter(
+            source=LedgerSource.FEE
+        ).aggregate(
+            pending_fees_amount=ledger_total(status='pending'),
+            paid_fees_amount=ledger_total(status='paid'),
+            total_revenue=ledger_total(),
+        ))
+        return {
+            "message": "Recent students fetched successfully",
+            "students": serializer.data,
+            "stats": stats
+        }
+
+    @method_decorator(conditional_get(Student, Guardian, FeePayment))
     def get(self, request):
         try:
-            students = Student.objects.filter(
-                is_active=True
-            ).order_by('-created_at')[:5]
-            serializer = DashboardStatsSerializer(students, many=True)
-            stats = {
-                'total_students': Student.objects.count(),
-                'total_active_students': Student.objects.filter(
-                    is_active=True
-                ).count(),
-                "pending_fees_amount": FeePayment.objects.filter(
-                    status='pending'
-                ).aggregate(total=models.Sum('amount'))['total'] or 0,
-                "paid_fees_amount": FeePayment.objects.filter(
-                    status='paid'
-                ).aggregate(total=models.Sum('amount'))['total'] or 0,
-                "total_revenue": FeePayment.objects.aggregate(
-                    total=models.Sum('amount')
-                )['total'] or 0,
-            }
-            return Response({
-                "message": "Recent students fetched successfully",
-                "students": serializer.data,
-                "stats": stats
-            }, status=status.HTTP_200_OK)
+            data = get_or_build(
+                'dashboard_stats', (Student, Guardian, FeePayment),
+                self.build_stats, timeout=DASHBOARD_CACHE_TIMEOUT
+            )
+            return Response(data, status=status.HTTP_200_OK)
         except Exception as e:
             print(traceback.format_exc())
             return Response(
@@ -1831,9 +2665,20 @@ class ListCreateExpenseAPIView(APIView):
                     "Use '-' prefix for descending."
                 ),
             ),
+            OpenApiParameter(
+                name="pagination",
+                type=OpenApiTypes.STR,
+                required=False,
+                enum=["page", "cursor"],
+                description=(
+                    "Pagination mode. 'cursor' returns keyset "
+                    "next/previous links; add count=true for the total."
+                ),
+            ),
         ],
         responses={200: ReadExpenseSerializer},
     )
+    @method_decorator(conditional_get(Expense))
     def get(self, request):
         try:
             expenses = Expense.objects.all()
@@ -1853,9 +2698,9 @@ class ListCreateExpenseAPIView(APIView):
             if category:
                 expenses = expenses.filter(category=category)
 
-            status = request.query_params.get('status', None)
-            if status:
-                expenses = expenses.filter(status=status)
+            expense_status = request.query_params.get('status', None)
+            if expense_status:
+                expenses = expenses.filter(status=expense_status)
 
             # Sort
             sort = request.query_params.get('sort')
@@ -1868,19 +2713,27 @@ class ListCreateExpenseAPIView(APIView):
                 "created_at",
             ]
 
+            order_fields = []
             if sort:
                 sort_field = sort.lstrip('-')
                 if sort_field in allowed_sort_fields:
                     expenses = expenses.order_by(sort)
+                    order_fields = [sort]
 
             # Pagination
-            paginator = StudentPagination()
+            paginator = get_list_paginator(
+                request, order_fields or ['-id'], StudentPagination
+            )
             paginated_queryset = paginator.paginate_queryset(
                 expenses, request
             )
 
             serializer = ReadExpenseSerializer(paginated_queryset, many=True)
             return paginator.get_paginated_response(serializer.data)
+        except NotFound as e:
+            return Response({
+                'error': str(e.detail)
+            }, status=status.HTTP_404_NOT_FOUND)
         except Exception as e:
             return Response({
                 'error': str(e)
@@ -1920,6 +2773,7 @@ class ExpenseDetailAPIView(APIView):
         description="Get a single expense by ID.",
         responses={200: ReadExpenseSerializer},
     )
+    @method_decorator(conditional_get(Expense))
     def get(self, request, pk):
         expense = get_object_or_404(Expense, pk=pk)
         serializer = ReadExpenseSerializer(expense)
@@ -1970,6 +2824,36 @@ class ExpenseDetailAPIView(APIView):
 
 
 class MonthlyFinanceSummaryAPIView(APIView):
+    def build_summary(self, now):
+        current_month_name = f"{now.strftime('%b')}-{now.year}"
+        print("CURRENT MONTH NAME ==", current_month_name)
+
+        # Totals for this month from the ledger, a handful of rows
+        categories = ["salary", "rent", "utilities", "other"]
+        total_revenue = 0
+        total_expenses = 0
+        expense_by_category = {category: 0 for category in categories}
+        for row in MonthlyLedger.objects.filter(
+            month=billing_month_of(now.date())
+        ):
+            if row.source == LedgerSource.FEE:
+                total_revenue += row.total
+                continue
+            total_expenses += row.total
+            if row.category in expense_by_category:
+                expense_by_category[row.category] += row.total
+        print('TOTAL REVENUE ==', total_revenue)
+        print('TOTAL EXPENSES ==', total_expenses)
+
+        return {
+            "message": "Monthly finance summary",
+            "month_name": current_month_name,
+            "total_revenue": total_revenue,
+            "total_expenses": total_expenses,
+            "net_profit": total_revenue - total_expenses,
+            "expense_by_category": expense_by_category,
+        }
+
     @extend_schema(
         summary="Get monthly finance summary",
         description=(
@@ -2007,44 +2891,16 @@ class MonthlyFinanceSummaryAPIView(APIView):
             },
         },
     )
+    @method_decorator(conditional_get(FeePayment, Expense))
     def get(self, request):
         try:
             now = timezone.now()
-            current_month_name = f"{now.strftime('%b')}-{now.year}"
-            print("CURRENT MONTH NAME ==", current_month_name)
-
-            # Total revenue for this month
-            total_revenue = FeePayment.objects.filter(
-                month_paid_for__month=now.month,
-                month_paid_for__year=now.year,
-            ).aggregate(Sum('amount'))['amount__sum'] or 0
-            print('TOTAL REVENUE ==', total_revenue)
-
-            # Total expenses for this month
-            total_expenses = Expense.objects.filter(
-                expense_date__month=now.month,
-                expense_date__year=now.year,
-            ).aggregate(Sum('amount'))['amount__sum'] or 0
-            print('TOTAL EXPENSES ==', total_expenses)
-
-            # Expenses by category
-            categories = ["salary", "rent", "utilities", "other"]
-            expense_by_category = {}
-            for category in categories:
-                expense_by_category[category] = Expense.objects.filter(
-                    expense_date__month=now.month,
-                    expense_date__year=now.year,
-                    category=category,
-                ).aggregate(Sum('amount'))['amount__sum'] or 0
-
-            return Response({
-                "message": "Monthly finance summary",
-                "month_name": current_month_name,
-                "total_revenue": total_revenue,
-                "total_expenses": total_expenses,
-                "net_profit": total_revenue - total_expenses,
-                "expense_by_category": expense_by_category,
-            })
+            data = get_or_build(
+                f'finance_summary_{now:%Y-%m}', (FeePayment, Expense),
+                lambda: self.build_summary(now),
+                timeout=FINANCE_CACHE_TIMEOUT
+            )
+            return Response(data)
 
         except Exception as e:
             traceback.print_exc()
@@ -2090,6 +2946,8 @@ class BulkTestRecordsAPIView(APIView):
         created_records = StudentTestRecords.objects.bulk_create(
             bulk_to_create
         )
+        # bulk_create sends no post_save
+        bump_cache_version(StudentTestRecords)
 
         current_total = student.total_tests_conducted or 0
         student.total_tests_conducted = current_total + len(created_records)
@@ -2103,6 +2961,7 @@ class BulkTestRecordsAPIView(APIView):
 
 
 class StudentAcademicSummaryAPIView(APIView):
+    @method_decorator(conditional_get(Student, StudentTestRecords))
     def get(self, request, student_id):
         try:
             student = Student.objects.get(id=student_id)
@@ -2165,60 +3024,64 @@ class StudentAcademicSummaryAPIView(APIView):
 
 
 class FinancialTrendsAPIView(APIView):
-    def get(self, request):
-        try:
-            enrollment_demographics = []
-
-            now = timezone.now()
-            expense_data = (
-                Expense.objects
-                .filter(expense_date__year=now.year)
-                .annotate(month=TruncMonth('expense_date'))
-                .values('month')
-                .annotate(total=Sum('amount'))
-            )
-
-            revenue_data = (
-                FeePayment.objects
-                .filter(date_paid__year=now.year)
-                .annotate(month=TruncMonth('date_paid'))
-                .values('month')
-                .annotate(total=Sum('amount'))
-            )
-
-            grade_count = Student.objects.values(
-                'grade'
-            ).annotate(count=Count('id'))
-            for grade in grade_count:
-                grades = {
-                    'grade': f"class {grade['grade']}",
-                    'count': grade['count']
-                }
-                enrollment_demographics.append(grades)
-
-            expense_dict = {
-                item['month'].month: item['total']
-                for item in expense_data
-            }
+    def build_trends(self, now):
+        enrollment_demographics = []
+
+        ledger_data = (
+            MonthlyLedger.objects
+            .filter(month__year=now.year)
+            .values('source', 'month')
+            .annotate(total=Sum('total'))
+            .order_by()
+        )
 
-            revenue_dict = {
-                item['month'].month: item['total']
-                for item in revenue_data
+        grade_count = Student.objects.values(
+            'grade'
+        ).annotate(count=Count('id'))
+        for grade in grade_count:
+            grades = {
+                'grade': f"class {grade['grade']}",
+                'count': grade['count']
             }
+            enrollment_demographics.append(grades)
+
+        expense_dict = {
+            item['month'].month: item['total']
+            for item in ledger_data
+            if item['source'] == LedgerSource.EXPENSE
+        }
+
+        revenue_dict = {
+            item['month'].month: item['total']
+            for item in ledger_data
+            if item['source'] == LedgerSource.FEE
+        }
+
+        financial_trends = []
+        for month in range(1, 13):
+            financial_trends.append({
+                "month": calendar.month_abbr[month],
+                "revenue": revenue_dict.get(month, 0),
+                "expense": expense_dict.get(month, 0),
+            })
 
-            financial_trends = []
-            for month in range(1, 13):
-                financial_trends.append({
-                    "month": calendar.month_abbr[month],
-                    "revenue": revenue_dict.get(month, 0),
-                    "expense": expense_dict.get(month, 0),
-                })
+        return {
+            "message": "Financial trends fetched successfully",
+            "financial_trends": financial_trends,
+            "enrollment_demographics": enrollment_demographics
+        }
 
-            return Response({
-                "message": "Financial trends fetched successfully",
-                "financial_trends": financial_trends,
-                "enrollment_demographics": enrollment_demographics
-            })
+    @method_decorator(conditional_get(Student, FeePayment, Expense))
+    def get(self, request):
+        try:
+            now = timezone.now()
+            data = get_or_build(
+                f'financial_trends_{now.year}',
+                (Student, FeePayment, Expense),
+                lambda: self.build_trends(now),
+                timeout=FINANCE_CACHE_TIMEOUT
+            )
+            return Response(data)
         except Exception as e:
             traceback.print_exc()
             return Response(
@@ -2228,6 +3091,7 @@ class FinancialTrendsAPIView(APIView):
 
 
 class AttendanceByClassAPIView(APIView):
+    @method_decorator(conditional_get(Student, StudentAttendance))
     def get(self, request):
         try:
             grade = request.query_params.get('grade', '')
@@ -2266,6 +3130,14 @@ class AttendanceByClassAPIView(APIView):
                         student.student_image.url
                         if student.student_image else None
                     ),
+                    "student_image_64": (
+                        student.student_image_64.url
+                        if student.student_image_64 else None
+                    ),
+                    "student_image_256": (
+                        student.student_image_256.url
+                        if student.student_image_256 else None
+                    ),
                     "date": date,
                     "status": record.status if record else "none",
                     "remarks": record.remarks if record else "",
@@ -2344,6 +3216,7 @@ class ListSubjectsAPIView(APIView):
         description="GET: All subjects list. POST: Create new subject.",
         tags=['Teachers']
     )
+    @method_decorator(conditional_get(Subject))
     def get(self, request):
         try:
             subjects = Subject.objects.all().order_by('name')
@@ -2393,17 +3266,25 @@ class ListCreateTeacherAPIView(APIView):
                 'subject_id', OpenApiTypes.INT, OpenApiParameter.QUERY,
                 description='Filter by subject ID'
             ),
+            OpenApiParameter(
+                'fields', OpenApiTypes.STR, OpenApiParameter.QUERY,
+                description='Comma separated fields to return'
+            ),
             OpenApiParameter(
                 'page', OpenApiTypes.INT, OpenApiParameter.QUERY
             ),
         ],
         tags=['Teachers']
     )
+    @method_decorator(conditional_get(
+        Teacher, TeacherSubject, Subject, SalaryPayment
+    ))
     def get(self, request):
         try:
-            queryset = Teacher.objects.prefetch_related(
-                'teacher_subjects__subject', 'salary_payments'
-            ).all()
+            sparse = get_sparse_fieldsets(request)
+            queryset = TeacherListSerializer.optimize_queryset(
+                Teacher.objects.all(), **sparse
+            )
 
             search = request.query_params.get('search')
             if search:
@@ -2422,7 +3303,9 @@ class ListCreateTeacherAPIView(APIView):
 
             paginator = TeacherPagination()
             paginated = paginator.paginate_queryset(queryset, request)
-            serializer = TeacherListSerializer(paginated, many=True)
+            serializer = TeacherListSerializer(
+                paginated, many=True, **sparse
+            )
 
             summary = {
                 'total_teachers': queryset.count(),
@@ -2483,6 +3366,9 @@ class TeacherDetailAPIView(APIView):
         summary="Get Teacher Detail",
         tags=['Teachers']
     )
+    @method_decorator(conditional_get(
+        Teacher, TeacherSubject, Subject, SalaryPayment
+    ))
     def get(self, request, teacher_id):
         try:
             teacher = self.get_object(teacher_id)
@@ -2549,6 +3435,7 @@ class TeacherSalaryAPIView(APIView):
         summary="List Salary Payments for Teacher",
         tags=['Teachers']
     )
+    @method_decorator(conditional_get(SalaryPayment))
     def get(self, request, teacher_id):
         try:
             teacher = get_object_or_404(Teacher, id=teacher_id)
@@ -2606,6 +3493,7 @@ class TeacherAttendanceByDateAPIView(APIView):
         ],
         tags=['Teacher Attendance']
     )
+    @method_decorator(conditional_get(Teacher, TeacherAttendance))
     def get(self, request):
         try:
             date = request.query_params.get('date', '')